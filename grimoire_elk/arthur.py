@@ -24,34 +24,139 @@
 #
 
 import inspect
+import json
 import logging
 import traceback
 
 from datetime import datetime
 from dateutil import parser
 
-from .ocean.conf import ConfOcean
+from . import query
+from .codec import decode
+from .elk.elastic import ElasticSearch
+from .ocean.state import OceanState
 from .utils import get_elastic
 from .utils import get_connectors, get_connector_from_name
-from .elk.utils import get_repository_filter, grimoire_con
+from .elk.utils import get_repository_filter, grimoire_con, TAG_FILTER_BACKENDS
+from .elk.checkpoint import EnrichCheckpoint
 
 
 logger = logging.getLogger(__name__)
 
 requests_ses = grimoire_con()
 
+def load_last_dates(url, backend_name, origins, es_index=None, es_index_enrich=None):
+    """ Get the last dates of many repositories sharing the same indexes
+
+    One query per index is done for all the repositories (origins, or tags
+    for backends filtered by tag). The dates are also cached, so feed_backend
+    and enrich_backend don't query them again for each repository when they
+    run in this process.
+
+    :returns: dicts with the last date of each origin in the raw and in the
+              enriched index, None for the indexes not given
+    """
+
+    connector = get_connector_from_name(backend_name)
+    if not connector:
+        raise RuntimeError("Unknown backend %s" % backend_name)
+
+    origin_field = 'tag' if backend_name in TAG_FILTER_BACKENDS else 'origin'
+
+    last_dates = None
+    last_enrich_dates = None
+
+    # Missing indexes are not created here: feed_backend must know it did it
+    if es_index and index_exists(url, es_index):
+        ocean_backend = connector[1](None)
+        elastic_ocean = get_elastic(url, es_index, False, ocean_backend)
+        last_dates = elastic_ocean.get_last_dates_by_origin(ocean_backend.get_field_date(),
+                                                            origins, origin_field)
+
+    if es_index_enrich and index_exists(url, es_index_enrich):
+        enrich_backend = connector[2]()
+        elastic_enrich = get_elastic(url, es_index_enrich, False, enrich_backend)
+        last_enrich_dates = elastic_enrich.get_last_dates_by_origin(enrich_backend.get_incremental_date(),
+                                                                    origins, origin_field)
+
+    logger.info("Last dates loaded for %i %s repositories", len(origins), backend_name)
+
+    return last_dates, last_enrich_dates
+
+
+def index_exists(url, es_index):
+    """ Check whether es_index exists without creating it """
+
+    r = requests_ses.head(url + "/" + ElasticSearch.safe_index(es_index))
+
+    return r.status_code == 200
+
+
+def feed_state(repo, repo_id, last_repo, feed_stats, bulk_stats):
+    """ Store in Ocean the state of a repository after feeding it
+
+        The position of the last item fed is only moved if all the items
+        have been fed, so the next feed starts from a safe point.
+    """
+
+    last_repo = last_repo if last_repo else {}
+
+    start = parser.parse(repo['repo_update_start'])
+    repo['duration'] = (parser.parse(repo['repo_update']) - start).total_seconds()
+    repo['items'] = feed_stats['items']
+    repo['items_dropped'] = feed_stats['dropped']
+    repo['items_total'] = last_repo.get('items_total', 0) + feed_stats['items']
+
+    repo['last_update'] = last_repo.get('last_update')
+    repo['last_offset'] = last_repo.get('last_offset')
+    if repo['success'] and not bulk_stats['dropped']:
+        if feed_stats['last_update']:
+            repo['last_update'] = feed_stats['last_update']
+        if feed_stats['last_offset'] is not None:
+            repo['last_offset'] = feed_stats['last_offset']
+
+    OceanState.set_repo(repo_id, repo)
+
+
+def same_index(last_repo, es_index, index_uuid):
+    """ Check whether the state of a previous feed is from es_index
+
+        The uuid of the index changes when it is deleted and created again,
+        or when the alias es_index points to another index.
+    """
+
+    if last_repo.get('index') != es_index:
+        return False
+    if last_repo.get('index_uuid') and index_uuid:
+        return last_repo['index_uuid'] == index_uuid
+
+    return True
+
+
 def feed_backend(url, clean, fetch_cache, backend_name, backend_params,
-                 es_index=None, es_index_enrich=None, project=None):
-    """ Feed Ocean with backend data """
+                 es_index=None, es_index_enrich=None, project=None,
+                 last_date=None):
+    """ Feed Ocean with backend data
+
+        :last_date: last date of the repository in the raw index, if it
+                    is already known. Used when there is no state of the
+                    previous feed, instead of querying it.
+    """
 
     backend = None
-    repo = {}    # repository data to be stored in conf
+    elastic_ocean = None
+    repo_id = None
+    last_repo = None  # state of the previous feed
+    repo = {}    # repository state to be stored in Ocean
     repo['backend_name'] = backend_name
     repo['backend_params'] = backend_params
 
     if es_index:
         clean = False  # don't remove index, it could be shared
 
+    # Full loads of not shared indexes are done in bulk load mode
+    bulk_load = clean
+
     if not get_connector_from_name(backend_name):
         raise RuntimeError("Unknown backend %s" % backend_name)
     connector = get_connector_from_name(backend_name)
@@ -71,9 +176,20 @@ def feed_backend(url, clean, fetch_cache, backend_name, backend_params,
 
         ocean_backend.set_elastic(elastic_ocean)
 
-        ConfOcean.set_elastic(elastic_ocean)
-
         repo['repo_update_start'] = datetime.now().isoformat()
+        repo['origin'] = backend.origin
+
+        OceanState.set_elastic(elastic_ocean)
+        repo_id = OceanState.get_repo_id(es_index, backend.origin)
+        if elastic_ocean.created:
+            # The index is new: the items of previous feeds are not in it
+            logger.info("Index %s created, %s fed from scratch", es_index, backend.origin)
+            last_date = None
+        elif not bulk_load and not fetch_cache:
+            last_repo = OceanState.get_repo(repo_id)
+            if last_repo and not same_index(last_repo, es_index, elastic_ocean.index_uuid):
+                logger.warning("State of %s ignored: it was fed into another index", repo_id)
+                last_repo = None
 
         # perceval backends fetch params
         offset = None
@@ -101,20 +217,44 @@ def feed_backend(url, clean, fetch_cache, backend_name, backend_params,
             except AttributeError:
                 category = backend_cmd.parsed_args.category
 
-        # from_date param support
-        if offset is not None and category:
-            ocean_backend.feed(from_offset=offset, category=category)
-        elif offset is not None:
-            ocean_backend.feed(from_offset=offset)
-        elif from_date and from_date.replace(tzinfo=None) != parser.parse("1970-01-01"):
-            if category:
-                ocean_backend.feed(from_date, category=category)
+        default_date = parser.parse("1970-01-01")
+
+        if last_repo:
+            # Continue from the last feed instead of finding its last item
+            if 'from_date' in signature.parameters and last_repo.get('last_update') and \
+               (not from_date or from_date.replace(tzinfo=None) == default_date):
+                from_date = parser.parse(last_repo['last_update'])
+            if 'offset' in signature.parameters and not offset and \
+               last_repo.get('last_offset') is not None:
+                offset = last_repo['last_offset']
+
+        if last_date and not bulk_load and not fetch_cache and \
+           'from_date' in signature.parameters and offset is None and \
+           (not from_date or from_date.replace(tzinfo=None) == default_date):
+            # Found with the dates of all the repositories by feed_backends
+            from_date = last_date
+
+        if bulk_load:
+            elastic_ocean.start_bulk_load()
+
+        try:
+            # from_date param support
+            if offset is not None and category:
+                ocean_backend.feed(from_offset=offset, category=category)
+            elif offset is not None:
+                ocean_backend.feed(from_offset=offset)
+            elif from_date and from_date.replace(tzinfo=None) != parser.parse("1970-01-01"):
+                if category:
+                    ocean_backend.feed(from_date, category=category)
+                else:
+                    ocean_backend.feed(from_date)
+            elif category:
+                ocean_backend.feed(category=category)
             else:
-                ocean_backend.feed(from_date)
-        elif category:
-            ocean_backend.feed(category=category)
-        else:
-            ocean_backend.feed()
+                ocean_backend.feed()
+        finally:
+            if bulk_load:
+                elastic_ocean.end_bulk_load()
 
     except Exception as ex:
         if backend:
@@ -129,21 +269,33 @@ def feed_backend(url, clean, fetch_cache, backend_name, backend_params,
         repo['error'] = str(ex)
     else:
         repo['success'] = True
+        repo['error'] = None
+
+    bulk_stats = None
+    if elastic_ocean:
+        bulk_stats = elastic_ocean.bulk_stats
+        logger.info("Bulk stats for %s: %i sent, %i failed, %i retried, %i dropped, "
+                    "%i spooled", elastic_ocean.index_url, bulk_stats['sent'],
+                    bulk_stats['failed'], bulk_stats['retried'], bulk_stats['dropped'],
+                    bulk_stats['spooled'])
+        repo['bulk_stats'] = bulk_stats
 
     repo['repo_update'] = datetime.now().isoformat()
     repo['index'] = es_index
+    repo['index_uuid'] = elastic_ocean.index_uuid if elastic_ocean else None
     repo['index_enrich'] = es_index_enrich
     repo['project'] = project
 
-    if es_index:
-        unique_id = es_index+"_"+backend.origin
-        ConfOcean.add_repo(unique_id, repo)
+    if repo_id:
+        feed_state(repo, repo_id, last_repo, ocean_backend.feed_stats, bulk_stats)
     else:
         logger.debug("Repository not added to Ocean because errors.")
         logger.debug(backend_params)
 
     logger.info("Done %s " % (backend_name))
 
+    return bulk_stats
+
 
 def get_items_from_uuid(uuid, enrich_backend, ocean_backend):
     """ Get all items that include uuid """
@@ -152,30 +304,17 @@ def get_items_from_uuid(uuid, enrich_backend, ocean_backend):
 
     uuid_fields = enrich_backend.get_fields_uuid()
 
-    terms = ""  # all terms with uuids in the enriched item
-
-    for field in uuid_fields:
-        terms += """
-         {"term": {
-           "%s": {
-              "value": "%s"
-           }
-         }}
-         """ % (field, uuid)
-        terms += ","
+    # all terms with uuids in the enriched item
+    terms = [query.term(field, uuid) for field in uuid_fields]
 
-    terms = terms[:-1]  # remove last , for last item
-
-    query = """
-    {"query": { "bool": { "should": [%s] }}}
-    """ % (terms)
+    data_json = query.search(query=query.bool_query(should=terms))
 
     url_search = enrich_backend.elastic.index_url+"/_search"
     url_search +="?size=1000"  # TODO get all items
 
-    r = requests_ses.post(url_search, data=query)
+    r = requests_ses.post(url_search, data=json.dumps(data_json))
 
-    eitems = r.json()['hits']['hits']
+    eitems = decode(r.content)['hits']['hits']
 
     if len(eitems) == 0:
         # logger.warning("No enriched items found for uuid: %s " % (uuid))
@@ -194,17 +333,10 @@ def get_items_from_uuid(uuid, enrich_backend, ocean_backend):
 
     url_mget = ocean_backend.elastic.index_url+"/_mget"
 
-    items_ids_query = ""
-
-    for item_id in items_ids:
-        items_ids_query += '{"_id" : "%s"}' % (item_id)
-        items_ids_query += ","
-    items_ids_query = items_ids_query[:-1]  # remove last , for last item
+    data_json = {"docs": [{"_id": item_id} for item_id in items_ids]}
+    r = requests_ses.post(url_mget, data=json.dumps(data_json))
 
-    query = '{"docs" : [%s]}' % (items_ids_query)
-    r = requests_ses.post(url_mget, data=query)
-
-    res_items = r.json()['docs']
+    res_items = decode(r.content)['docs']
 
     items = []
     for res_item in res_items:
@@ -213,22 +345,49 @@ def get_items_from_uuid(uuid, enrich_backend, ocean_backend):
 
     return items
 
+def changed_fields(eitem, fields, field_id):
+    """ Return the fields with a new value in eitem, and its unique id field,
+        or None if nothing changed """
+
+    changed = {field: value for field, value in fields.items()
+               if field not in eitem or eitem[field] != value}
+    if not changed:
+        return None
+
+    changed[field_id] = eitem[field_id]
+
+    return changed
+
+
 def refresh_projects(enrich_backend):
+    """ Generate the project fields changed in enriched items """
+
     logger.debug("Refreshing project field in %s", enrich_backend.elastic.index_url)
     total = 0
+    total_changed = 0
+
+    field_id = enrich_backend.get_field_unique_id()
 
     eitems = enrich_backend.fetch()
     for eitem in eitems:
-        new_project = enrich_backend.get_item_project(eitem)
-        eitem.update(new_project)
-        yield eitem
         total += 1
+        new_project = enrich_backend.get_item_project(eitem)
+        changed = changed_fields(eitem, new_project, field_id)
+        if changed:
+            total_changed += 1
+            yield changed
 
-    logger.info("Total eitems refreshed for project field %i", total)
+    logger.info("Total eitems refreshed for project field %i (%i changed)",
+                total, total_changed)
 
 def refresh_identities(enrich_backend, filter_author=None):
+    """ Generate the identities fields changed in enriched items """
+
     logger.debug("Refreshing identities fields from %s", enrich_backend.elastic.index_url)
     total = 0
+    total_changed = 0
+
+    field_id = enrich_backend.get_field_unique_id()
 
     for eitem in enrich_backend.fetch(filter_author):
         #logger.info(eitem)
@@ -238,11 +397,14 @@ def refresh_identities(enrich_backend, filter_author=None):
         except AttributeError:
             pass
         new_identities = enrich_backend.get_item_sh_from_id(eitem, roles)
-        eitem.update(new_identities)
-        yield eitem
         total += 1
+        changed = changed_fields(eitem, new_identities, field_id)
+        if changed:
+            total_changed += 1
+            yield changed
 
-    logger.info("Total eitems refreshed for identities fields %i", total)
+    logger.info("Total eitems refreshed for identities fields %i (%i changed)",
+                total, total_changed)
 
 def load_identities(ocean_backend, enrich_backend):
     try:
@@ -289,7 +451,13 @@ def enrich_items(ocean_backend, enrich_backend, events=False):
         total = enrich_backend.enrich_events(ocean_backend)
     return total
 
-def get_last_enrich(backend_cmd, enrich_backend):
+def get_last_enrich(backend_cmd, enrich_backend, last_enrich_date=None):
+    """ Date or offset to start the enrichment from
+
+        :last_enrich_date: last date of the repository in the enriched
+                           index, if it is already known
+    """
+
     last_enrich = None
 
     if backend_cmd:
@@ -320,6 +488,8 @@ def get_last_enrich(backend_cmd, enrich_backend):
         if from_date:
             if from_date.replace(tzinfo=None) != parser.parse("1970-01-01"):
                 last_enrich = from_date
+            elif last_enrich_date:
+                last_enrich = last_enrich_date
             else:
                 last_enrich = enrich_backend.get_last_update_from_es([filter_])
 
@@ -335,13 +505,23 @@ def get_last_enrich(backend_cmd, enrich_backend):
 
 
 def get_ocean_backend(backend_cmd, enrich_backend, no_incremental,
-                      filter_raw=None, filter_raw_should=None):
+                      filter_raw=None, filter_raw_should=None,
+                      last_enrich_date=None):
     """ Get the ocean backend configured to start from the last enriched date """
 
-    if no_incremental:
+    checkpoint_key = None
+    if enrich_backend.use_checkpoints and backend_cmd:
+        enrich_backend.checkpoint = EnrichCheckpoint(enrich_backend.elastic,
+                                                     enrich_backend.get_connector_name(),
+                                                     backend_cmd.backend.origin)
+        if not no_incremental:
+            checkpoint_key = enrich_backend.checkpoint.load()
+
+    if no_incremental or checkpoint_key:
+        # The checkpoint is the exact position, no need to find the last date
         last_enrich = None
     else:
-        last_enrich = get_last_enrich(backend_cmd, enrich_backend)
+        last_enrich = get_last_enrich(backend_cmd, enrich_backend, last_enrich_date)
 
     logger.debug("Last enrichment: %s", last_enrich)
 
@@ -377,6 +557,15 @@ def get_ocean_backend(backend_cmd, enrich_backend, no_incremental,
     if filter_raw_should:
         ocean_backend.set_filter_raw_should(filter_raw_should)
 
+    # Read from Ocean only the fields needed to enrich the items
+    ocean_backend.set_source_filter(enrich_backend.get_raw_source_filter())
+
+    if enrich_backend.checkpoint:
+        # Checkpoints are search_after sort keys of the raw items
+        ocean_backend.fetch_search_after = True
+        ocean_backend.scroll_slices = 1
+        ocean_backend.search_after_key = checkpoint_key
+
     return ocean_backend
 
 def do_studies(enrich_backend, no_incremental=False):
@@ -404,14 +593,23 @@ def enrich_backend(url, clean, backend_name, backend_params, ocean_index=None,
                    do_refresh_projects=False, do_refresh_identities=False,
                    author_id=None, author_uuid=None, filter_raw=None,
                    filters_raw_prefix=None, jenkins_rename_file=None,
-                   unaffiliated_group=None):
-    """ Enrich Ocean index """
+                   unaffiliated_group=None, last_enrich_date=None):
+    """ Enrich Ocean index
+
+        :last_enrich_date: last date of the repository in the enriched
+                           index, if it is already known
+    """
 
 
     backend = None
     enrich_index = None
 
-    if ocean_index or ocean_index_enrich:
+    shared = ocean_index or ocean_index_enrich
+
+    # Full enrichments of not shared indexes are done in bulk load mode
+    bulk_load = (clean or no_incremental) and not shared
+
+    if shared:
         clean = False  # don't remove index, it could be shared
 
     if do_refresh_projects or do_refresh_identities:
@@ -475,7 +673,7 @@ def enrich_backend(url, clean, backend_name, backend_params, ocean_index=None,
 
         ocean_backend = get_ocean_backend(backend_cmd, enrich_backend,
                                           no_incremental, filter_raw_dict,
-                                          filter_raw_should)
+                                          filter_raw_should, last_enrich_date)
 
         if only_studies:
             logger.info("Running only studies (no SH and no enrichment)")
@@ -484,7 +682,7 @@ def enrich_backend(url, clean, backend_name, backend_params, ocean_index=None,
             logger.info("Refreshing project field in enriched index")
             field_id = enrich_backend.get_field_unique_id()
             eitems = refresh_projects(enrich_backend)
-            enrich_backend.elastic.bulk_upload_sync(eitems, field_id)
+            enrich_backend.elastic.bulk_update(eitems, field_id)
         elif do_refresh_identities:
 
             filter_author = None
@@ -499,7 +697,7 @@ def enrich_backend(url, clean, backend_name, backend_params, ocean_index=None,
             field_id = enrich_backend.get_field_unique_id()
             logger.info(field_id)
             eitems = refresh_identities(enrich_backend, filter_author)
-            enrich_backend.elastic.bulk_upload_sync(eitems, field_id)
+            enrich_backend.elastic.bulk_update(eitems, field_id)
         else:
             clean = False  # Don't remove ocean index when enrich
             elastic_ocean = get_elastic(url, ocean_index, clean, ocean_backend)
@@ -517,18 +715,30 @@ def enrich_backend(url, clean, backend_name, backend_params, ocean_index=None,
                 logger.info("Only SH identities added. Enrich not done!")
 
             else:
-                # Enrichment for the new items once SH update is finished
-                if not events_enrich:
-                    enrich_count = enrich_items(ocean_backend, enrich_backend)
-                    if enrich_count is not None:
-                        logger.info("Total items enriched %i ", enrich_count)
-                else:
-                    enrich_count = enrich_items(ocean_backend, enrich_backend, events=True)
-                    if enrich_count is not None:
-                        logger.info("Total events enriched %i ", enrich_count)
+                if bulk_load:
+                    elastic_enrich.start_bulk_load()
+                try:
+                    # Enrichment for the new items once SH update is finished
+                    if not events_enrich:
+                        enrich_count = enrich_items(ocean_backend, enrich_backend)
+                        if enrich_count is not None:
+                            logger.info("Total items enriched %i ", enrich_count)
+                    else:
+                        enrich_count = enrich_items(ocean_backend, enrich_backend, events=True)
+                        if enrich_count is not None:
+                            logger.info("Total events enriched %i ", enrich_count)
+                finally:
+                    if bulk_load:
+                        elastic_enrich.end_bulk_load()
                 if studies:
                     do_studies(enrich_backend)
 
+            bulk_stats = enrich_backend.elastic.bulk_stats
+            logger.info("Bulk stats for %s: %i sent, %i failed, %i retried, %i dropped, "
+                        "%i spooled", enrich_backend.elastic.index_url, bulk_stats['sent'],
+                        bulk_stats['failed'], bulk_stats['retried'], bulk_stats['dropped'],
+                        bulk_stats['spooled'])
+
     except Exception as ex:
         logger.error("%s", traceback.format_exc())
         if backend:
@@ -0,0 +1,114 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# JSON codec for the documents sent to and read from ElasticSearch
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+# Authors:
+#   Alvaro del Castillo San Felix <acs@bitergia.com>
+#
+
+"""JSON encoding and decoding using the fastest library available
+
+orjson or ujson are used if installed, and the standard json module if not.
+Data the fast libraries can not handle (big integers, invalid unicode) is
+processed with the standard json module, so the results and the errors
+(for example, TypeError for datetimes) are the same as with json. The only
+difference is that orjson decodes integers bigger than 64 bits as floats,
+which ES can not store as numbers anyway.
+"""
+
+import json
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+def _unserializable(obj):
+    raise TypeError("Object of type %s is not JSON serializable" % type(obj).__name__)
+
+
+def json_encode(obj):
+    return json.dumps(obj).encode('utf-8')
+
+
+def json_decode(data):
+    if isinstance(data, bytes):
+        data = data.decode('utf-8')
+    return json.loads(data)
+
+
+def orjson_encode(obj):
+    # Datetimes are not serialized by json, so orjson must not do it
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+    try:
+        return orjson.dumps(obj, option=options)
+    except TypeError:
+        return json_encode(obj)
+
+
+def orjson_decode(data):
+    try:
+        return orjson.loads(data)
+    except ValueError:
+        return json_decode(data)
+
+
+def ujson_encode(obj):
+    try:
+        return ujson.dumps(obj, ensure_ascii=False,
+                           default=_unserializable).encode('utf-8')
+    except (TypeError, OverflowError, UnicodeEncodeError):
+        return json_encode(obj)
+
+
+def ujson_decode(data):
+    try:
+        return ujson.loads(data)
+    except ValueError:
+        return json_decode(data)
+
+
+# Available codecs: name -> (encode, decode)
+CODECS = {"json": (json_encode, json_decode)}
+if ujson:
+    CODECS["ujson"] = (ujson_encode, ujson_decode)
+if orjson:
+    CODECS["orjson"] = (orjson_encode, orjson_decode)
+
+if orjson:
+    CODEC_NAME = "orjson"
+elif ujson:
+    CODEC_NAME = "ujson"
+else:
+    CODEC_NAME = "json"
+
+logger.debug("JSON codec: %s", CODEC_NAME)
+
+encode, decode = CODECS[CODEC_NAME]
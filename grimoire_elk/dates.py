@@ -0,0 +1,151 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Parsing of the dates found in the data sources
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+# Authors:
+#   Alvaro del Castillo San Felix <acs@bitergia.com>
+#
+
+"""Parse dates faster than dateutil for the formats of the data sources
+
+ISO 8601 (most APIs), RFC 2822 (email Date headers) and the ctime-like
+dates of git and twitter are parsed with regular expressions. Any other
+string is parsed with dateutil, so the results are the same as with
+dateutil.parser.parse: naive datetimes if there is no timezone, and
+tzutc or tzoffset timezones if there is one. Parsed strings are cached,
+as the same dates are found many times in an item and between items.
+"""
+
+import re
+
+from datetime import datetime
+from functools import lru_cache
+
+from dateutil import parser, tz
+
+
+CACHE_SIZE = 8192  # dates kept parsed
+
+_ISO_RE = re.compile(r"(\d{4})-(\d{2})-(\d{2})"
+                     r"(?:[T ](\d{2}):(\d{2})(?::(\d{2})(?:[.,](\d+))?)?)?"
+                     r"\s*(Z|[+-]\d{2}(?::?\d{2})?)?$")
+
+_MONTHS = {"jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+           "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12}
+
+# Tue, 7 Mar 2017 10:27:12 +0100. UT is left to dateutil, which returns naive dates for it
+_RFC2822_RE = re.compile(r"(?:[A-Za-z]{3},?\s+)?(\d{1,2})\s+([A-Za-z]{3})\s+(\d{4})\s+"
+                         r"(\d{1,2}):(\d{2})(?::(\d{2}))?"
+                         r"\s+([+-]\d{4}|GMT|UTC|Z)$")
+
+# git: Tue Mar 7 10:27:12 2017 +0100, twitter: Tue Mar 07 10:27:12 +0000 2017
+_CTIME_RE = re.compile(r"[A-Za-z]{3}\s+([A-Za-z]{3})\s+(\d{1,2})\s+"
+                       r"(\d{1,2}):(\d{2}):(\d{2})\s+"
+                       r"(?:(\d{4})\s+([+-]\d{4})|([+-]\d{4})\s+(\d{4}))$")
+
+
+def _tzinfo(offset):
+    """ dateutil timezone for an offset like Z, UTC, +01, +0100 or +01:00 """
+
+    if offset is None:
+        return None
+    if offset in ("Z", "GMT", "UTC"):
+        return tz.tzutc()
+
+    sign = -1 if offset[0] == "-" else 1
+    digits = offset[1:].replace(":", "")
+    seconds = int(digits[:2]) * 3600
+    if len(digits) > 2:
+        seconds += int(digits[2:]) * 60
+
+    if seconds == 0:
+        return tz.tzutc()
+
+    return tz.tzoffset(None, sign * seconds)
+
+
+def _parse_iso(date_str):
+    match = _ISO_RE.match(date_str)
+    if not match:
+        return None
+
+    (year, month, day, hour, minute, second, fraction, offset) = match.groups()
+
+    microsecond = 0
+    if fraction:
+        # Like dateutil, fractions after the microseconds are truncated
+        microsecond = int(fraction[:6].ljust(6, "0"))
+
+    return datetime(int(year), int(month), int(day), int(hour or 0), int(minute or 0),
+                    int(second or 0), microsecond, _tzinfo(offset))
+
+
+def _parse_rfc2822(date_str):
+    match = _RFC2822_RE.match(date_str)
+    if not match:
+        return None
+
+    (day, month, year, hour, minute, second, offset) = match.groups()
+
+    month = _MONTHS.get(month.lower())
+    if not month:
+        return None
+
+    return datetime(int(year), month, int(day), int(hour), int(minute),
+                    int(second or 0), 0, _tzinfo(offset))
+
+
+def _parse_ctime(date_str):
+    match = _CTIME_RE.match(date_str)
+    if not match:
+        return None
+
+    (month, day, hour, minute, second, year, offset, offset_first, year_last) = match.groups()
+
+    month = _MONTHS.get(month.lower())
+    if not month:
+        return None
+
+    return datetime(int(year or year_last), month, int(day), int(hour), int(minute),
+                    int(second), 0, _tzinfo(offset or offset_first))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_date(date_str):
+    """ Parse a date string like dateutil.parser.parse does """
+
+    date = None
+
+    if isinstance(date_str, str):
+        value = date_str.strip()
+        try:
+            date = _parse_iso(value)
+            if date is None:
+                date = _parse_rfc2822(value)
+            if date is None:
+                date = _parse_ctime(value)
+        except ValueError:
+            # Out of range values: dateutil will raise the error
+            date = None
+
+    if date is None:
+        date = parser.parse(date_str)
+
+    return date
@@ -27,7 +27,13 @@
 
 import json
 import logging
+import queue
+import threading
 
+from time import time
+
+from . import query
+from .codec import encode, decode
 from .elk.utils import unixtime_to_datetime, get_repository_filter, grimoire_con
 
 logger = logging.getLogger(__name__)
@@ -38,6 +44,28 @@ class ElasticItems():
     # In large projects like Eclipse commits, 100 is too much
     # Change it from p2o command line or mordred config
     scroll_size = 100
+    # Scroll slices read in parallel (1 to read the items with one scroll)
+    scroll_slices = 1
+    # Keep the items ordered inside each slice (slower in ES)
+    scroll_slices_sorted = True
+    # Page perceval items with search_after instead of scroll
+    fetch_search_after = False
+    # Field to break ties in the incremental date when using search_after
+    search_after_tiebreaker = "uuid"
+    # Read only the fields in source_filter (False to read whole items)
+    source_filtering = True
+    # Pages read in background while the current one is processed (0 to disable)
+    scroll_prefetch = 1
+    # Count the items before fetching them, to report the progress
+    fetch_count = True
+    # Adapt the page size to the size of the items and the ES response time
+    scroll_adaptive = False
+    scroll_size_min = 10
+    scroll_size_max = 5000
+    scroll_target_bytes = 5 * 1024 * 1024  # bytes per page
+    scroll_target_latency = 5  # seconds per page
+
+    page_lock = threading.Lock()
 
     def __init__(self, perceval_backend, from_date=None, insecure=True, offset=None):
 
@@ -47,9 +75,21 @@ class ElasticItems():
         self.offset = offset  # fetch from offset
         self.filter_raw = None  # to filter raw items from Ocean
         self.filter_raw_should = None  # to filter raw items from Ocean
+        self.source_filter = None  # fields to get from Ocean items
 
         self.requests = grimoire_con(insecure)
         self.elastic = None
+        # Sort values of the item to start after when fetching with search_after
+        self.search_after_key = None
+        # Sort values of the last item returned by fetch, with search_after
+        self.last_sort_key = None
+        # Items per page, adapted if scroll_adaptive. A scroll keeps the
+        # size it is opened with, so in scroll mode it is used in the next one
+        self.page_size = self.scroll_size
+        # Items to be returned by the last fetch, if counted
+        self.fetch_total = None
+        # Search queries built in the last fetch, reused in all its pages
+        self.query_cache = {}
 
     def get_repository_filter_raw(self, term=False):
         """ Returns the filter to be used in queries in a repository items """
@@ -75,6 +115,11 @@ class ElasticItems():
         """ Bool filter should to be used when getting items from Ocean index """
         self.filter_raw_should = filter_raw_should
 
+    def set_source_filter(self, source_filter):
+        """ _source filtering (dict with includes and excludes lists) used
+            when getting items from Ocean index """
+        self.source_filter = source_filter
+
     def get_connector_name(self):
         """ Find the name for the current connector """
         from .utils import get_connector_name
@@ -83,32 +128,269 @@ class ElasticItems():
     # Items generator
     def fetch(self, _filter=None):
         """ Fetch the items from raw or enriched index. An optional _filter
-        could be provided to filter the data collected """
+        could be provided to filter the data collected. The number of items
+        to be fetched is in fetch_total if fetch_count is enabled. """
 
         logger.debug("Creating a elastic items generator.")
 
+        self.fetch_total = None
+        # Filters and dates could have changed since the last fetch
+        self.query_cache = {}
+        if self.fetch_count:
+            self.fetch_total = self.count_items(_filter)
+
+        return self.fetch_items(_filter)
+
+    def count_items(self, _filter=None):
+        """ Return the number of items fetch returns, None if unknown """
+
+        if not self.elastic:
+            return None
+
+        url = self.elastic.index_url + "/_count"
+        body = query.search(query=query.bool_query(must=self.get_query_filters(_filter)))
+
+        try:
+            r = self.requests.post(url, data=encode(body))
+            r.raise_for_status()
+            return decode(r.content)["count"]
+        except Exception as ex:
+            logger.warning("Can't count the items in %s: %s", url, ex)
+            return None
+
+    def fetch_items(self, _filter=None):
+        """ Generate the items from raw or enriched index """
+
+        if self.scroll_slices > 1:
+            pages = self.fetch_sliced_pages(_filter)
+        elif self.fetch_search_after and self.perceval_backend:
+            pages = self.fetch_pages_search_after(_filter)
+        else:
+            pages = self.fetch_pages(_filter)
+
+        if self.scroll_slices <= 1 and self.scroll_prefetch > 0:
+            pages = self.prefetch_pages([pages], self.scroll_prefetch)
+
+        try:
+            for hits in pages:
+                for hit in hits:
+                    # Sort values of the item, to resume after it
+                    self.last_sort_key = hit.get("sort")
+                    eitem = hit['_source']
+                    yield eitem
+        finally:
+            pages.close()
+
+    def fetch_pages(self, _filter=None, _slice=None):
+        """ Generate the pages of hits of a scroll over the items
+
+            The scroll is cleared when the generator ends, fails or is closed.
+
+            :_slice: dict with the id and max slices to read only a slice
+        """
+
         elastic_scroll_id = None
 
-        while True:
-            rjson = self.get_elastic_items(elastic_scroll_id, _filter)
+        try:
+            while True:
+                rjson = self.get_elastic_items(elastic_scroll_id, _filter, _slice)
+
+                if rjson and "_scroll_id" in rjson:
+                    elastic_scroll_id = rjson["_scroll_id"]
+
+                if rjson and "hits" in rjson:
+                    if len(rjson["hits"]["hits"]) == 0:
+                        break
+                    yield rjson["hits"]["hits"]
+                else:
+                    logger.error("No results found from %s", self.elastic.index_url)
+                    break
+        finally:
+            if elastic_scroll_id:
+                self.clear_scroll(elastic_scroll_id)
 
-            if rjson and "_scroll_id" in rjson:
-                elastic_scroll_id = rjson["_scroll_id"]
+    def fetch_pages_search_after(self, _filter=None):
+        """ Generate the pages of hits using search_after
+
+            Nothing is kept in ES between pages. The first page starts after
+            the sort values in search_after_key, so the fetching can be
+            resumed setting it to the last_sort_key of a previous fetch.
+        """
+
+        search_after = self.search_after_key if self.search_after_key else []
+
+        while True:
+            rjson = self.get_elastic_items(_filter=_filter, search_after=search_after)
 
             if rjson and "hits" in rjson:
-                if len(rjson["hits"]["hits"]) == 0:
+                hits = rjson["hits"]["hits"]
+                if len(hits) == 0:
                     break
-                for hit in rjson["hits"]["hits"]:
-                    eitem = hit['_source']
-                    yield eitem
+                search_after = hits[-1]["sort"]
+                yield hits
             else:
                 logger.error("No results found from %s", self.elastic.index_url)
                 break
-        return
 
-    def get_elastic_items(self, elastic_scroll_id=None, _filter=None):
+    def clear_scroll(self, elastic_scroll_id):
+        """ Free the scroll context in ES, without waiting for it to expire """
+
+        url = self.elastic.url + "/_search/scroll"
+        try:
+            r = self.requests.delete(url, data=json.dumps({"scroll_id": [elastic_scroll_id]}))
+            if r.status_code not in (200, 404):
+                logger.warning("Can't clear scroll in %s: %s", url, r.text)
+        except Exception as ex:
+            # Don't hide the error which stopped the scroll, if any
+            logger.warning("Can't clear scroll in %s: %s", url, ex)
+
+    def fetch_sliced_pages(self, _filter=None):
+        """ Generate the pages of hits reading scroll_slices slices in parallel
+
+        The order of the items is kept inside each slice, not between slices.
+        """
+
+        slices = [self.fetch_pages(_filter, {"id": slice_id, "max": self.scroll_slices})
+                  for slice_id in range(self.scroll_slices)]
+
+        return self.prefetch_pages(slices, 2 * self.scroll_slices)
+
+    def prefetch_pages(self, page_generators, depth):
+        """ Generate the pages of page_generators, read in background threads
+
+        Each generator is read in a thread and its pages are sent through a
+        bounded queue of depth pages, so the next pages are requested while
+        the current one is processed, and only a few are kept in memory.
+        The generators are closed when done or when this one is closed.
+        """
+
+        pages = queue.Queue(maxsize=depth)
+        stop = threading.Event()  # the consumer is gone, stop reading
+
+        def put(page):
+            while not stop.is_set():
+                try:
+                    pages.put(page, timeout=1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def read(generator):
+            try:
+                for hits in generator:
+                    if not put(hits) or stop.is_set():
+                        return
+            except Exception as ex:
+                put(ex)
+            finally:
+                generator.close()
+                put(None)
+
+        readers = [threading.Thread(target=read, args=(generator,), daemon=True)
+                   for generator in page_generators]
+        for reader in readers:
+            reader.start()
+
+        try:
+            running = len(readers)
+            while running:
+                page = pages.get()
+                if page is None:
+                    running -= 1
+                elif isinstance(page, Exception):
+                    raise page
+                else:
+                    yield page
+        finally:
+            stop.set()
+            # Wait for the readers to close their generators
+            for reader in readers:
+                while reader.is_alive():
+                    try:
+                        pages.get_nowait()
+                    except queue.Empty:
+                        reader.join(0.1)
+
+    def get_query_filters(self, _filter=None):
+        """ Return the list of filters (queries) to get the items """
+
+        # If using a perceval backends always filter by repository
+        # to support multi repository indexes
+        filters = []
+        repository_filter = self.get_repository_filter_raw(term=True)
+        if repository_filter:
+            filters.append(repository_filter)
+
+        if self.filter_raw:
+            filters.append(query.term(self.filter_raw['name'], self.filter_raw['value']))
+
+        if _filter:
+            filters.append(query.terms(_filter['name'], _filter['value']))
+
+        if self.from_date:
+            filters.append(query.range_gte(self.get_incremental_date(),
+                                           self.from_date.isoformat()))
+        elif self.offset:
+            filters.append(query.range_gte("offset", self.offset))
+
+        if self.filter_raw_should:
+            # We need to add a bool should query to the outer must query
+            filters.append({"bool": self.filter_raw_should})
+
+        return filters
+
+    def get_search_query(self, _filter=None, _slice=None, search_after=None):
+        """ Return the body of the search for the items
+
+        The query is built once for each filter and slice and reused in
+        the next pages. It must not be modified by the callers.
+        """
+
+        key = (json.dumps(_filter, sort_keys=True), json.dumps(_slice, sort_keys=True),
+               search_after is not None)
+
+        if key not in self.query_cache:
+            # Order the raw items from the old ones to the new so if the
+            # enrich process fails, it could be resume incrementally
+            sort = None
+            order_field = None
+            if self.perceval_backend:
+                order_field = self.get_incremental_date()
+            elif self.get_connector_name() == 'twitter':
+                order_field = '@timestamp'
+            if _slice and not self.scroll_slices_sorted:
+                # Sorting by index order is the fastest way to scroll
+                order_field = None
+                sort = ["_doc"]
+            if search_after is not None:
+                # The sort must be unique for items with the same date
+                sort = query.sort_asc(order_field, self.search_after_tiebreaker)
+            elif order_field is not None:
+                sort = query.sort_asc(order_field)
+
+            source = None
+            if self.source_filtering:
+                source = self.source_filter
+
+            self.query_cache[key] = query.search(
+                query=query.bool_query(must=self.get_query_filters(_filter)),
+                sort=sort, source=source, slice_=_slice)
+
+        body = self.query_cache[key]
+        if search_after:
+            body = dict(body, search_after=search_after)
+
+        return body
+
+    def get_elastic_items(self, elastic_scroll_id=None, _filter=None, _slice=None,
+                          search_after=None):
         """ Get the items from the index related to the backend applying and
-        optional _filter if provided"""
+        optional _filter if provided. With _slice only the items in the
+        slice (dict with its id and the max slices) are returned.
+
+        Items are paged with search_after (sort values of the last item, or
+        an empty list for the first page) instead of scroll if provided."""
 
         if not self.elastic:
             return None
@@ -117,8 +399,13 @@ class ElasticItems():
         # In gerrit enrich with 500 items per page we need >1 min
         # In Mozilla ES in Amazon we need 10m
         max_process_items_pack_time = "10m"  # 10 minutes
-        url += "/_search?scroll=%s&size=%i" % (max_process_items_pack_time,
-                                               self.scroll_size)
+        if search_after is not None:
+            url += "/_search?size=%i" % self.page_size
+        else:
+            url += "/_search?scroll=%s&size=%i" % (max_process_items_pack_time,
+                                                   self.page_size)
+
+        request_init = time()
 
         if elastic_scroll_id:
             """ Just continue with the scrolling """
@@ -130,82 +417,40 @@ class ElasticItems():
                 }
             r = self.requests.post(url, data=json.dumps(scroll_data))
         else:
-            # If using a perceval backends always filter by repository
-            # to support multi repository indexes
-            # We need the filter dict as a string to join with the rest
-            filters = self.get_repository_filter_raw(term=True)
-            filters = json.dumps(filters)
-
-            if self.filter_raw:
-                filters += '''
-                    , {"term":
-                        { "%s":"%s"  }
-                    }
-                ''' % (self.filter_raw['name'], self.filter_raw['value'])
-
-            if _filter:
-                filter_str = '''
-                    , {"terms":
-                        { "%s": %s }
-                    }
-                ''' % (_filter['name'], _filter['value'])
-                # List to string conversion uses ' that are not allowed in JSON
-                filter_str = filter_str.replace("'", "\"")
-                filters += filter_str
-
-            if self.from_date:
-                date_field = self.get_incremental_date()
-                from_date = self.from_date.isoformat()
-
-                filters += '''
-                    , {"range":
-                        {"%s": {"gte": "%s"}}
-                    }
-                ''' % (date_field, from_date)
-            elif self.offset:
-                filters += '''
-                    , {"range":
-                        {"offset": {"gte": %i}}
-                    }
-                ''' % (self.offset)
+            body = self.get_search_query(_filter, _slice, search_after)
 
-            # Order the raw items from the old ones to the new so if the
-            # enrich process fails, it could be resume incrementally
-            order_query = ''
-            order_field = None
-            if self.perceval_backend:
-                order_field = self.get_incremental_date()
-            elif self.get_connector_name() == 'twitter':
-                order_field = '@timestamp'
-            if order_field is not None:
-                order_query = ', "sort": { "%s": { "order": "asc" }} ' % order_field
-
-            filters_should = ''
-            if self.filter_raw_should:
-                filters_should = json.dumps(self.filter_raw_should)[1:-1]
-                # We need to add a bool should query to the outer must query
-                query_should = '{"bool": {%s}}' % filters_should
-                filters += ", " + query_should
-
-            query = """
-            {
-                "query": {
-                    "bool": {
-                        "must": [%s]
-                    }
-                } %s
-            }
-            """ % (filters, order_query)
-
-            logger.debug("%s\n%s", url, json.dumps(json.loads(query), indent=4))
-            r = self.requests.post(url, data=query)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("%s\n%s", url, json.dumps(body, indent=4))
+            r = self.requests.post(url, data=encode(body))
 
         items = []
         rjson = None
         try:
-            rjson = r.json()
+            rjson = decode(r.content)
         except:
             logger.error("No JSON found in %s" % (r.text))
             logger.error("No results found from %s" % (url))
 
+        if self.scroll_adaptive and rjson and "hits" in rjson and rjson["hits"]["hits"]:
+            self.adapt_page_size(len(r.content), time() - request_init,
+                                 len(rjson["hits"]["hits"]))
+
         return rjson
+
+    def adapt_page_size(self, page_bytes, latency, hits):
+        """ Change the page size to get scroll_target_bytes per page in less
+            than scroll_target_latency seconds """
+
+        with self.page_lock:
+            page_size = int(self.scroll_target_bytes / (page_bytes / hits))
+            if latency > self.scroll_target_latency:
+                page_size = min(page_size,
+                                int(hits * self.scroll_target_latency / latency))
+            # Grow slowly: small pages could be a filter with few results
+            page_size = min(page_size, 2 * self.page_size)
+            page_size = max(self.scroll_size_min, min(self.scroll_size_max, page_size))
+
+            if page_size != self.page_size:
+                logger.debug("Page size changed from %i to %i items (%i bytes, %.2f sec)",
+                             self.page_size, page_size, page_bytes, latency)
+                self.page_size = page_size
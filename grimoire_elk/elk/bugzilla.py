@@ -28,8 +28,7 @@ import logging
 
 from datetime import datetime
 
-from dateutil import parser
-
+from ..dates import parse_date
 from .enrich import Enrich, metadata
 
 from .utils import get_time_diff_days
@@ -153,7 +152,7 @@ class BugzillaEnrich(Enrich):
                 eitem["reporter_email"] = issue["reporter"][0]["__text__"]
                 eitem["author_email"] = issue["reporter"][0]["__text__"]
 
-        date_ts = parser.parse(issue['creation_ts'][0]['__text__'])
+        date_ts = parse_date(issue['creation_ts'][0]['__text__'])
         eitem['creation_date'] = date_ts.strftime('%Y-%m-%dT%H:%M:%S')
 
 
@@ -168,7 +167,7 @@ class BugzillaEnrich(Enrich):
 
 
         # Fix dates
-        date_ts = parser.parse(issue['delta_ts'][0]['__text__'])
+        date_ts = parse_date(issue['delta_ts'][0]['__text__'])
         eitem['changeddate_date'] = date_ts.isoformat()
         eitem['delta_ts'] = date_ts.strftime('%Y-%m-%dT%H:%M:%S')
 
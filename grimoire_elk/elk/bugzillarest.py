@@ -24,10 +24,10 @@
 #
 
 from time import time
-from dateutil import parser
 import json
 import logging
 
+from ..dates import parse_date
 from .enrich import Enrich, metadata, DEFAULT_PROJECT
 
 from .utils import get_time_diff_days
@@ -137,9 +137,9 @@ class BugzillaRESTEnrich(Enrich):
         eitem["product"]  = issue['product']
 
         # Fix dates
-        date_ts = parser.parse(issue['creation_time'])
+        date_ts = parse_date(issue['creation_time'])
         eitem['creation_ts'] = date_ts.strftime('%Y-%m-%dT%H:%M:%S')
-        date_ts = parser.parse(issue['last_change_time'])
+        date_ts = parse_date(issue['last_change_time'])
         eitem['changeddate_date'] = date_ts.isoformat()
         eitem['delta_ts'] = date_ts.strftime('%Y-%m-%dT%H:%M:%S')
 
@@ -0,0 +1,103 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Checkpoints to resume the enrichment of a raw index
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+# Authors:
+#   Alvaro del Castillo San Felix <acs@bitergia.com>
+#
+
+import json
+import logging
+
+from datetime import datetime
+
+import requests
+
+from .utils import grimoire_con
+from ..codec import encode, decode
+
+
+logger = logging.getLogger(__name__)
+
+
+class EnrichCheckpoint(object):
+    """ Position of the last raw item enriched for a backend and origin
+
+    The position is the search_after sort key of the raw item, saved in
+    a document of the checkpoints index once the bulk pack with its
+    enriched items is acknowledged. Fetching the raw items after it
+    resumes the enrichment exactly where it was left.
+    """
+
+    index = "gelk_checkpoints"
+
+    def __init__(self, elastic, backend_name, origin, insecure=True):
+        """
+            :elastic: ElasticSearch object of the enriched index
+            :backend_name: perceval backend enriched
+            :origin: origin of the raw items enriched
+        """
+
+        self.backend_name = backend_name
+        self.origin = origin
+        self.index_enrich = elastic.index
+
+        checkpoint_id = "%s_%s_%s" % (backend_name, origin, elastic.index)
+        self.url = elastic.url + "/" + self.index + "/items/"
+        self.url += elastic.safe_index(checkpoint_id)
+
+        self.requests = grimoire_con(insecure)
+
+    def load(self):
+        """ Return the sort key saved, None if there is no checkpoint """
+
+        r = self.requests.get(self.url)
+        if r.status_code == 404:
+            return None
+        r.raise_for_status()
+
+        rjson = decode(r.content)
+        if not rjson.get("found"):
+            return None
+
+        sort_key = json.loads(rjson["_source"]["sort_key"])
+        logger.info("Resuming %s enrichment of %s after %s",
+                    self.backend_name, self.origin, sort_key)
+
+        return sort_key
+
+    def save(self, sort_key):
+        """ Save the sort key of the last raw item enriched """
+
+        doc = {
+            "backend_name": self.backend_name,
+            "origin": self.origin,
+            "index_enrich": self.index_enrich,
+            # The values in sort keys have different types
+            "sort_key": json.dumps(sort_key),
+            "updated": datetime.utcnow().isoformat()
+        }
+
+        try:
+            r = self.requests.put(self.url, data=encode(doc))
+            r.raise_for_status()
+        except requests.exceptions.RequestException as ex:
+            # The next run will do again the work done since the last one saved
+            logger.warning("Can't save checkpoint %s: %s", self.url, ex)
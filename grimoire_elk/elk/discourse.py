@@ -242,21 +242,9 @@ class DiscourseEnrich(Enrich):
     def get_field_unique_id_answer(self):
         return "id"
 
-    def enrich_items(self, ocean_backend):
-        items = ocean_backend.fetch()
-
-        nitems = super(DiscourseEnrich, self).enrich_items(ocean_backend)
-        logger.info("Total questions enriched: %i", nitems)
+    def rich_documents(self, item):
+        yield item[self.get_field_unique_id()], self.get_rich_item(item)
 
         # And now for each item we want also the answers (tops)
-        items = ocean_backend.fetch()
-        nanswers = 0
-        rich_item_answers = []
-
-        for item in items:
-            rich_item_answers += self.get_rich_item_answers(item)
-
-        if rich_item_answers:
-            nanswers += self.elastic.bulk_upload(rich_item_answers,
-                                                 self.get_field_unique_id_answer())
-        logger.info("Total answers enriched: %i", nanswers)
+        for answer in self.get_rich_item_answers(item):
+            yield answer[self.get_field_unique_id_answer()], answer
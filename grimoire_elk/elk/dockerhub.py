@@ -22,9 +22,7 @@
 #   Alvaro del Castillo San Felix <acs@bitergia.com>
 #
 
-import json
 import logging
-import sys
 
 from .enrich import Enrich, metadata
 
@@ -34,6 +32,13 @@ logger = logging.getLogger(__name__)
 
 class DockerHubEnrich(Enrich):
 
+    def __init__(self, db_sortinghat=None, db_projects_map=None, json_projects_map=None,
+                 db_user='', db_password='', db_host=''):
+        super().__init__(db_sortinghat, db_projects_map, json_projects_map,
+                         db_user, db_password, db_host)
+
+        self.images_items = {}  # last enriched event of each image
+
     def get_field_author(self):
         return "nick"
 
@@ -97,73 +102,24 @@ class DockerHubEnrich(Enrich):
 
         return eitem
 
-    def enrich_items(self, ocean_backend, events=False):
-        """ A custom enrich items is needed because apart from the enriched
-        events from raw items, a image item with the last data for an image
-        must be created """
-
-        max_items = self.elastic.max_items_bulk
-        current = 0
-        total = 0
-        bulk_json = ""
-
-        items = ocean_backend.fetch()
-        images_items = {}
-
-        url = self.elastic.index_url+'/items/_bulk'
-
-        logger.debug("Adding items to %s (in %i packs)", url, max_items)
-
-        for item in items:
-            if current >= max_items:
-                r = self.requests.put(url, data=bulk_json)
-                r.raise_for_status()
-                json_size = sys.getsizeof(bulk_json) / (1024*1024)
-                logger.debug("Added %i items to %s (%0.2f MB)", total, url, json_size)
-                bulk_json = ""
-                current = 0
-
-            rich_item = self.get_rich_item(item)
-            data_json = json.dumps(rich_item)
-            bulk_json += '{"index" : {"_id" : "%s" } }\n' % \
-                (item[self.get_field_unique_id()])
-            bulk_json += data_json +"\n"  # Bulk document
-            current += 1
-            total += 1
-
-            if rich_item['id'] not in images_items:
-                # Let's transform the rich_event in a rich_image
-                rich_item['is_docker_image'] = 1
-                rich_item['is_event'] = 0
-                images_items[rich_item['id']] = rich_item
-            else:
-                image_date = images_items[rich_item['id']]['last_updated']
-                if image_date <= rich_item['last_updated']:
-                    # This event is newer for the image
-                    rich_item['is_docker_image'] = 1
-                    rich_item['is_event'] = 0
-                    images_items[rich_item['id']] = rich_item
-
+    def collect_rich_document(self, doc_id, rich_doc):
+        """ Apart from the enriched events from raw items, a image item with
+        the last data for an image must be created """
 
-        if total == 0:
-            # No items enriched, nothing to upload to ES
-            return total
-
-        r = self.requests.put(url, data=bulk_json)
-        r.raise_for_status()
+        image = self.images_items.get(rich_doc['id'])
+        if image is None or image['last_updated'] <= rich_doc['last_updated']:
+            # This event is newer for the image
+            # Let's transform the rich_event in a rich_image
+            image = dict(rich_doc)
+            image['is_docker_image'] = 1
+            image['is_event'] = 0
+            self.images_items[rich_doc['id']] = image
 
+    def get_collected_documents(self):
         # Time to upload the images enriched items. The id is uuid+"_image"
         # Normally we are enriching events for a unique image so all images
         # data can be upload in one query
+        images_items, self.images_items = self.images_items, {}
         for image in images_items:
             data = images_items[image]
-            data_json = json.dumps(data)
-            bulk_json += '{"index" : {"_id" : "%s" } }\n' % \
-                (data['id'] + "_image")
-            bulk_json += data_json +"\n"  # Bulk document
-            total += 1
-
-        r = self.requests.put(url, data=bulk_json)
-        r.raise_for_status()
-
-        return total
+            yield data['id'] + "_image", data
@@ -23,19 +23,32 @@
 #   Alvaro del Castillo San Felix <acs@bitergia.com>
 #
 
-from datetime import datetime
-from dateutil import parser
+import glob
+import gzip
 import json
 import logging
-import sys
+import os
+import threading
 
+import requests
+
+from concurrent.futures import ThreadPoolExecutor
 from time import time, sleep
 
+from ..dates import parse_date
+from .. import query
+from ..codec import encode, decode
 from .utils import unixtime_to_datetime, grimoire_con
 
 
 logger = logging.getLogger(__name__)
 
+# Visibility in searches of the documents uploaded with the bulk API
+REFRESH_NONE = "none"  # use the refresh_interval of the index
+REFRESH_END = "end-of-run"  # refresh the index once all packs are sent
+REFRESH_BATCH = "per-batch"  # refresh the index with each pack
+REFRESH_MODES = (REFRESH_NONE, REFRESH_END, REFRESH_BATCH)
+
 
 class ElasticConnectException(Exception):
     message = "Can't connect to ElasticSearch"
@@ -46,6 +59,21 @@ class ElasticWriteException(Exception):
 class ElasticSearch(object):
 
     max_items_bulk = 1000
+    max_bytes_bulk = 20 * 1024 * 1024  # 20 MB per bulk request
+    bulk_workers = 1  # bulk requests sent in parallel
+    bulk_max_retries = 5  # retries for documents rejected by ES
+    bulk_backoff_factor = 0.5  # seconds to wait before the first retry
+    bulk_max_latency = 10  # seconds for a bulk request before reducing packs
+    bulk_load_force_merge = False  # force merge the index after bulk loads
+    http_compression = False  # gzip the body of bulk requests
+    bulk_spool_dir = None  # directory to keep the packs ES could not index
+    bulk_spool_timeout = 120  # seconds for a bulk request before spooling it
+
+    DEFAULT_REFRESH_INTERVAL = "1s"
+
+    # Last dates of the origins in the indexes, shared by all the instances
+    # (index_url, field, origin_field) -> {origin: last date}
+    last_dates_cache = {}
 
     @classmethod
     def safe_index(cls, unique_id):
@@ -65,9 +93,26 @@ class ElasticSearch(object):
         # Valid index for elastic
         self.index = self.safe_index(index)
         self.index_url = self.url+"/"+self.index
-        self.wait_bulk_seconds = 2  # time to wait to complete a bulk operation
+        # Items per bulk request, adapted to the cluster load
+        self.bulk_size = self.max_items_bulk
+        # Documents sent, failed, retried, dropped and spooled in bulk requests
+        # and bytes sent
+        self.bulk_stats = {"sent": 0, "failed": 0, "retried": 0, "dropped": 0,
+                           "spooled": 0, "bytes": 0}
+        # Index settings to be restored after a bulk load
+        self.bulk_load_settings = None
 
         self.requests = grimoire_con(insecure)
+        self.requests_bulk = self.requests
+        if self.bulk_spool_dir:
+            # Don't wait for ES to come back: the packs are spooled. Each read
+            # retry could wait bulk_spool_timeout again.
+            self.requests_bulk = grimoire_con(insecure, conn_retries=1, read_retries=0)
+
+        # True if the index is new, so nothing fed before is in it
+        self.created = False
+        # Id of the index the name (or alias) points to, if known
+        self.index_uuid = None
 
         r = self.requests.get(self.index_url)
 
@@ -80,87 +125,151 @@ class ElasticSearch(object):
                 raise ElasticWriteException()
             else:
                 logger.info("Created index " + self.index_url)
+                self.created = True
         else:
             if clean:
                 self.requests.delete(self.index_url)
                 self.requests.put(self.index_url, data=analyzers)
                 logger.info("Deleted and created index " + self.index_url)
+                self.created = True
+            else:
+                self.index_uuid = self.__get_index_uuid(r.json())
         if mappings:
             self.create_mappings(mappings)
 
-    def _safe_put_bulk(self, url, bulk_json):
-        """ Bulk PUT controlling unicode issues """
+    @staticmethod
+    def __get_index_uuid(rjson):
+        """ Return the uuid of the index in the response to GET index_url """
 
-        try:
-            self.requests.put(url, data=bulk_json)
-        except UnicodeEncodeError:
-            # Related to body.encode('iso-8859-1'). mbox data
-            logger.error("Encondig error ... converting bulk to iso-8859-1")
-            bulk_json = bulk_json.encode('iso-8859-1','ignore')
-            self.requests.put(url, data=bulk_json)
+        # Keyed by the real index names: an alias could point to several
+        if len(rjson) != 1:
+            return None
+
+        return list(rjson.values())[0].get('settings', {}).get('index', {}).get('uuid')
+
+    def _safe_put_bulk(self, url, bulk_json, headers=None):
+        """ Bulk PUT of an already encoded (bytes) body """
+
+        timeout = self.bulk_spool_timeout if self.bulk_spool_dir else None
 
-    def bulk_upload(self, items, field_id):
-        ''' Upload in controlled packs items to ES using bulk API '''
+        return self.requests_bulk.put(url, data=bulk_json, headers=headers,
+                                      timeout=timeout)
 
-        current = 0
-        new_items = 0  # total items added with bulk
-        bulk_json = ""
+    def bulk_upload(self, items, field_id, refresh=REFRESH_NONE):
+        ''' Upload in controlled packs items to ES using bulk API
+
+            :refresh: when to make the items visible in searches
+        '''
 
-        url = self.index_url+'/items/_bulk'
+        bulk = BulkWriter(self, refresh=refresh)
 
-        logger.debug("Adding items to %s (in %i packs)" % (url, self.max_items_bulk))
+        logger.debug("Adding items to %s (in %i packs)" % (bulk.url, bulk.max_items))
 
         for item in items:
-            if current >= self.max_items_bulk:
-                task_init = time()
-                self._safe_put_bulk(url, bulk_json)
-                bulk_json = ""
-                new_items += current
-                current = 0
-                json_size = sys.getsizeof(bulk_json) / (1024*1024)
-                logger.debug("bulk packet sent (%.2f sec, %i total, %.2f MB)"
-                              % (time()-task_init, new_items, json_size))
-            data_json = json.dumps(item)
-            bulk_json += '{"index" : {"_id" : "%s" } }\n' % (item[field_id])
-            bulk_json += data_json +"\n"  # Bulk document
-            current += 1
-        task_init = time()
-        self._safe_put_bulk(url, bulk_json)
-        new_items += current
-        json_size = sys.getsizeof(bulk_json) / (1024*1024)
-        logger.debug("bulk packet sent (%.2f sec prev, %i total, %.2f MB)"
-                      % (time()-task_init, new_items, json_size))
+            bulk.add(item[field_id], item)
+        bulk.flush()
+
+        return bulk.total
+
+    def bulk_update(self, items, field_id, refresh=REFRESH_END):
+        ''' Update in controlled packs the fields in items of already
+            uploaded documents, using the bulk API
+
+            :items: partial documents with the fields to update and field_id
+            :refresh: when to make the changes visible in searches
+        '''
 
-        return new_items
+        bulk = BulkWriter(self, refresh=refresh)
+
+        for item in items:
+            bulk.update(item[field_id], item)
+        bulk.flush()
+
+        return bulk.total
 
     def bulk_upload_sync(self, items, field_id, sync=True):
         ''' Upload in controlled packs items to ES using bulk API
-            and wait until the items appears in searches '''
+            and refresh the index so the items appears in searches '''
+
+        refresh = REFRESH_END if sync else REFRESH_NONE
+
+        return self.bulk_upload(items, field_id, refresh=refresh)
+
+    def refresh(self):
+        """ Make all the operations done in the index visible in searches """
+
+        r = self.requests.post(self.index_url + "/_refresh")
+        r.raise_for_status()
+
+    def get_settings(self):
+        """ Return the dynamic index settings changed during bulk loads """
 
-        # After a bulk upload the searches are not refreshed real time
-        # This method waits until the upload is visible in searches
+        r = self.requests.get(self.index_url + "/_settings")
+        r.raise_for_status()
 
-        r = self.requests.get(self.index_url+'/_search?size=1')
-        total = r.json()['hits']['total']  # Already existing items
-        new_items = self.bulk_upload(items, field_id)
-        if not sync:
+        # The response is keyed by the real index name (it could be an alias)
+        index_settings = list(r.json().values())[0]['settings']['index']
+
+        return {
+            "refresh_interval": index_settings.get("refresh_interval",
+                                                   self.DEFAULT_REFRESH_INTERVAL),
+            "number_of_replicas": index_settings.get("number_of_replicas")
+        }
+
+    def put_settings(self, settings):
+        """ Change dynamic index settings """
+
+        r = self.requests.put(self.index_url + "/_settings",
+                              data=json.dumps({"index": settings}))
+        r.raise_for_status()
+
+    def start_bulk_load(self):
+        """ Tune the index for a large load: no refresh and no replicas
+
+        The current settings are restored with end_bulk_load. It must
+        always be called once the load is done, even if it fails. If the
+        index is already in bulk load mode (another process is loading it)
+        nothing is changed, so its settings are not taken as the previous ones.
+        """
+
+        settings = self.get_settings()
+        if str(settings["refresh_interval"]) == "-1":
+            logger.warning("Bulk load mode not started for %s: refresh is already disabled",
+                           self.index_url)
             return
-        total += new_items
-
-        # Wait until in searches all items are returned
-        # In incremental update, some items are updates not additions so
-        # this check will fail. Exist ok in the timeout for this case.
-
-        total_search = 0  # total items found with search
-        search_start = datetime.now()
-        while total_search != total:
-            sleep(0.1)
-            r = self.requests.get(self.index_url+'/_search?size=1')
-            total_search = r.json()['hits']['total']
-            if (datetime.now()-search_start).total_seconds() > self.wait_bulk_seconds:
-                logger.debug("Bulk data does not appear as NEW after %is" % (self.wait_bulk_seconds))
-                logger.debug("Probably %i item updates" % (total-total_search))
-                break
+
+        self.bulk_load_settings = settings
+        self.put_settings({"refresh_interval": "-1", "number_of_replicas": 0})
+
+        logger.info("Bulk load mode started for %s (previous settings %s)",
+                    self.index_url, self.bulk_load_settings)
+
+    def end_bulk_load(self, force_merge=None):
+        """ Restore the index settings changed in start_bulk_load
+
+            :force_merge: merge the index segments after the load
+        """
+
+        if not self.bulk_load_settings:
+            return
+
+        if force_merge is None:
+            force_merge = self.bulk_load_force_merge
+
+        try:
+            settings = {"refresh_interval": self.bulk_load_settings["refresh_interval"]}
+            if self.bulk_load_settings["number_of_replicas"] is not None:
+                settings["number_of_replicas"] = self.bulk_load_settings["number_of_replicas"]
+            self.put_settings(settings)
+        finally:
+            self.bulk_load_settings = None
+
+        self.refresh()
+        if force_merge:
+            r = self.requests.post(self.index_url + "/_forcemerge")
+            r.raise_for_status()
+
+        logger.info("Bulk load mode finished for %s", self.index_url)
 
     def create_mappings(self, mappings):
 
@@ -211,6 +320,72 @@ class ElasticSearch(object):
 
         return offset
 
+    def get_last_dates_by_origin(self, field, origins, origin_field="origin"):
+        ''' Return the last date in field for each origin using one query
+
+            The dates are cached so get_last_date does not need to query ES
+            for each origin.
+
+            :field: field with the date
+            :origins: values of the origins
+            :origin_field: field with the origin (origin or tag)
+        '''
+
+        last_dates = {origin: None for origin in origins}
+
+        if not last_dates:
+            return last_dates
+
+        aggs = {"origins": query.terms_agg(origin_field, len(last_dates),
+                                           {"1": query.max_agg(field)})}
+        data_json = query.search(query=query.terms(origin_field, last_dates),
+                                 size=0, aggs=aggs)
+
+        url = self.index_url + "/_search"
+        logger.debug("%s %s", url, data_json)
+        res = self.requests.post(url, data=json.dumps(data_json))
+        res.raise_for_status()
+
+        for bucket in res.json()["aggregations"]["origins"]["buckets"]:
+            last_dates[bucket["key"]] = self.__get_agg_date(bucket["1"])
+
+        cache_key = (self.index_url, field, origin_field)
+        self.last_dates_cache.setdefault(cache_key, {}).update(last_dates)
+
+        return last_dates
+
+    def __get_cached_last_date(self, field, _filters):
+        """ Return True and the cached last date for the origin in _filters
+            or False if it is not cached """
+
+        _filters = [_filter for _filter in _filters if _filter]
+        if len(_filters) != 1:
+            return False, None
+
+        cache = self.last_dates_cache.get((self.index_url, field, _filters[0]['name']))
+        if not cache or _filters[0]['value'] not in cache:
+            return False, None
+
+        # The date changes once the origin is updated, so it is used once
+        return True, cache.pop(_filters[0]['value'])
+
+    @staticmethod
+    def __get_agg_date(agg):
+        """ Return the date in the result of a max aggregation """
+
+        if "value_as_string" in agg:
+            last_value = parse_date(agg["value_as_string"])
+        else:
+            last_value = agg["value"]
+            if last_value:
+                try:
+                    last_value = unixtime_to_datetime(last_value)
+                except ValueError:
+                    # last_value is in microsecs
+                    last_value = unixtime_to_datetime(last_value/1000)
+
+        return last_value
+
     def get_last_item_field(self, field, _filters = [], offset = False):
         '''
             :field: field with the data
@@ -220,36 +395,22 @@ class ElasticSearch(object):
 
         last_value = None
 
+        if _filters and not offset:
+            cached, last_value = self.__get_cached_last_date(field, _filters)
+            if cached:
+                return last_value
+
         url = self.index_url
         url += "/_search"
 
-        data_query = ''
         if _filters is None: _filters = []
-        for _filter in _filters:
-            if not _filter:
-                continue
-            data_query += '''
-                "query" : {
-                    "term" : { "%s" : "%s"  }
-                 },
-            ''' % (_filter['name'], _filter['value'])
-
-        data_agg = '''
-            "aggs": {
-                "1": {
-                  "max": {
-                    "field": "%s"
-                  }
-                }
-            }
-        ''' % (field)
-
-        data_json = '''
-        { "size": 0, %s  %s
-        } ''' % (data_query, data_agg)
+        # All the filters must match
+        data_query = query.bool_query(must=query.filters_to_terms(_filters))
+        data_json = query.search(query=data_query, size=0,
+                                 aggs={"1": query.max_agg(field)})
 
         logger.debug("%s %s", url, data_json)
-        res = self.requests.post(url, data=data_json)
+        res = self.requests.post(url, data=json.dumps(data_json))
         res_json = res.json()
 
         if 'aggregations' in res_json:
@@ -259,15 +420,433 @@ class ElasticSearch(object):
                 if last_value is not None:
                     last_value = int(last_value)
             else:
-                if "value_as_string" in res_json["aggregations"]["1"]:
-                    last_value = res_json["aggregations"]["1"]["value_as_string"]
-                    last_value = parser.parse(last_value)
-                else:
-                    last_value = res_json["aggregations"]["1"]["value"]
-                    if last_value:
-                        try:
-                            last_value = unixtime_to_datetime(last_value)
-                        except ValueError:
-                            # last_value is in microsecs
-                            last_value = unixtime_to_datetime(last_value/1000)
+                last_value = self.__get_agg_date(res_json["aggregations"]["1"])
         return last_value
+
+
+class BulkWriter(object):
+    """ Send documents to ElasticSearch in packs using the bulk API
+
+    Documents are encoded when added and kept as a list of byte chunks
+    so building a pack is linear. A pack is sent when it reaches
+    max_items documents or max_bytes bytes, whatever happens first.
+
+    With more than one worker, packs are sent from a thread pool while
+    the caller keeps adding documents. At most two packs per worker can
+    be waiting to be acknowledged, so memory stays bounded.
+
+    The bulk response is checked for each document. Documents rejected
+    because the cluster is overloaded are sent again with exponential
+    backoff, and the pack size is reduced while rejections or slow
+    responses are found. It grows back once the cluster recovers.
+
+    If ElasticSearch.bulk_spool_dir is configured, the packs which can
+    not be indexed because ES is down, fails or keeps rejecting them
+    are written to gzip files in that directory, and so are all the
+    packs after them to keep the order. replay_spool sends them later.
+    To keep that order the packs are sent by a single worker, and while
+    packs are waiting in the directory the new ones are spooled after
+    them, so a replay never overwrites documents indexed later.
+
+    Callers can mark the position of the documents added with mark().
+    on_commit, if set, is called with the last marker whose documents
+    and all the previous ones have been sent, in the order of the marks
+    even if the packs are acknowledged out of order by the workers. Once
+    documents of a pack are dropped or fail, no more markers are committed.
+    """
+
+    # Bulk statuses for rejected documents which could be retried
+    RETRY_STATUS = (429, 503)
+    # Only the data needed to find the failed documents in the response
+    RESPONSE_FILTER = "filter_path=errors,items.*.status,items.*.error"
+    MIN_ITEMS = 10  # smallest pack when reducing it
+    # Fast gzip level: JSON documents compress well even with it
+    COMPRESS_LEVEL = 3
+    SPOOL_EXT = ".bulk.gz"
+
+    lock = threading.Lock()
+    spool_seq = 0  # packs spooled in the process, to keep their order
+
+    def __init__(self, elastic, url=None, max_items=None, max_bytes=None,
+                 workers=None, refresh=REFRESH_NONE):
+        """
+            :elastic: ElasticSearch object used to send the packs
+            :url: bulk endpoint (default to the items type in the index)
+            :max_items: max number of documents in a pack
+            :max_bytes: max size in bytes of a pack
+            :workers: number of packs sent in parallel
+            :refresh: when to make the documents visible in searches
+        """
+
+        if refresh not in REFRESH_MODES:
+            raise ValueError("Unknown refresh mode %s" % refresh)
+
+        self.elastic = elastic
+        self.refresh = refresh
+        self.url = url if url else elastic.index_url + '/items/_bulk'
+        self.max_bytes = max_bytes if max_bytes else elastic.max_bytes_bulk
+        self.workers = workers if workers else elastic.bulk_workers
+        self.spool_dir = elastic.bulk_spool_dir
+        # Once a pack is spooled, all the next ones are
+        self.spooling = False
+
+        if self.spool_dir:
+            # Packs in parallel could be indexed after a previous one spooled
+            self.workers = 1
+            if spooled_packs(self.spool_dir):
+                logger.warning("Packs pending in %s: documents for %s spooled until "
+                               "they are replayed", self.spool_dir, self.url)
+                self.spooling = True
+
+        # Start with the size adapted by previous packs sent to the index
+        self.max_items_limit = max_items if max_items else elastic.max_items_bulk
+        self.max_items = min(self.max_items_limit,
+                             getattr(elastic, 'bulk_size', self.max_items_limit))
+
+        self.chunks = []  # encoded actions and documents of the current pack
+        self.current = 0  # documents in the current pack
+        self.size = 0  # bytes in the current pack
+        self.stats = {"sent": 0, "failed": 0, "retried": 0, "dropped": 0,
+                      "spooled": 0, "bytes": 0}
+
+        self.executor = None
+        self.pending = []  # packs sent but not acknowledged yet
+        self.in_flight = threading.BoundedSemaphore(2 * self.workers)
+
+        self.on_commit = None  # called with the last marker sent
+        self.marker = None  # last marker of the current pack
+        self.pack_seq = 0  # packs sent
+        self.acked = {}  # markers of the packs acknowledged before previous ones
+        self.next_ack = 1  # sequence of the first pack not acknowledged
+        self.commit_lock = threading.Lock()
+        self.committing = True  # False once documents have been lost
+
+    @property
+    def total(self):
+        """ Documents indexed in ElasticSearch """
+        return self.stats["sent"]
+
+    def add(self, doc_id, doc):
+        """ Add a document to the current pack, sending it if it is full """
+
+        action = '{"index" : {"_id" : "%s" } }\n' % (doc_id)
+        data_json = encode(doc)  # Bulk document
+
+        self.add_chunk(action.encode('utf-8') + data_json + b"\n")
+
+    def update(self, doc_id, fields):
+        """ Add to the current pack the update of some fields of a document """
+
+        action = '{"update" : {"_id" : "%s" } }\n' % (doc_id)
+        data_json = encode({"doc": fields})
+
+        self.add_chunk(action.encode('utf-8') + data_json + b"\n")
+
+    def mark(self, marker):
+        """ Mark the position of the documents added until now """
+
+        self.marker = marker
+
+    def add_chunk(self, chunk):
+        """ Add an already encoded action and document to the current pack """
+
+        self.chunks.append(chunk)
+        self.current += 1
+        self.size += len(chunk)
+
+        if self.current >= self.max_items or self.size >= self.max_bytes:
+            self._send()
+
+    def flush(self):
+        """ Send the current pack and wait until all packs are acknowledged """
+
+        self._send()
+
+        if self.executor:
+            try:
+                for future in self.pending:
+                    future.result()
+            finally:
+                self.pending = []
+                self.executor.shutdown()
+                self.executor = None
+
+        if self.on_commit and self.marker is not None and self.committing:
+            # Marked after the last pack sent, all its documents are sent
+            self.on_commit(self.marker)
+            self.marker = None
+
+        if self.refresh == REFRESH_END and self.total > 0:
+            self.elastic.refresh()
+
+        if self.stats["failed"] or self.stats["dropped"] or self.stats["spooled"]:
+            logger.warning("Bulk upload to %s: %i sent, %i failed, %i retried, "
+                           "%i dropped, %i spooled", self.url, self.stats["sent"],
+                           self.stats["failed"], self.stats["retried"],
+                           self.stats["dropped"], self.stats["spooled"])
+        else:
+            logger.debug("Bulk upload to %s: %i sent, %i retried",
+                         self.url, self.stats["sent"], self.stats["retried"])
+
+    def _send(self):
+        """ Send the current pack, in a worker thread if configured """
+
+        if self.current == 0:
+            return
+
+        chunks = self.chunks
+        size = self.size
+        marker = self.marker
+
+        self.chunks = []
+        self.current = 0
+        self.size = 0
+        self.marker = None
+        self.pack_seq += 1
+
+        if self.workers <= 1:
+            self._put_pack(chunks, size, self.pack_seq, marker)
+            return
+
+        # Report errors from already finished packs as soon as possible
+        for future in [f for f in self.pending if f.done()]:
+            self.pending.remove(future)
+            future.result()
+
+        if not self.executor:
+            self.executor = ThreadPoolExecutor(max_workers=self.workers)
+
+        self.in_flight.acquire()
+        try:
+            future = self.executor.submit(self._put_pack, chunks, size,
+                                          self.pack_seq, marker)
+        except Exception:
+            self.in_flight.release()
+            raise
+        future.add_done_callback(lambda f: self.in_flight.release())
+        self.pending.append(future)
+
+    def _put_pack(self, chunks, size, seq, marker):
+        """ Send a pack and commit the markers of the packs sent in order """
+
+        indexed = self._put(chunks, size)
+
+        with self.commit_lock:
+            if not indexed and self.committing:
+                # Resuming after a later marker would skip the documents lost
+                logger.warning("Documents lost in %s: markers not committed anymore",
+                               self.url)
+                self.committing = False
+            self.acked[seq] = marker
+            commit = None
+            while self.next_ack in self.acked:
+                marker = self.acked.pop(self.next_ack)
+                self.next_ack += 1
+                if marker is not None:
+                    commit = marker
+            if commit is not None and self.on_commit and self.committing:
+                self.on_commit(commit)
+
+    def _put(self, chunks, size):
+        """ Send a pack retrying the documents rejected by ElasticSearch
+
+        :returns: False if documents were dropped or failed, True if all of
+                  them were indexed or spooled
+        """
+
+        sep = '&' if '?' in self.url else '?'
+        url = self.url + sep + self.RESPONSE_FILTER
+        if self.refresh == REFRESH_BATCH:
+            url += "&refresh=true"
+
+        retries = 0
+        task_init = time()
+        lost = 0  # documents dropped or failed
+
+        headers = None
+        if self.elastic.http_compression:
+            headers = {'Content-Encoding': 'gzip'}
+
+        while True:
+            if self.spooling:
+                self._spool(chunks)
+                return lost == 0
+
+            request_init = time()
+            bulk_json = b"".join(chunks)
+            if headers:
+                bulk_json = gzip.compress(bulk_json, self.COMPRESS_LEVEL)
+            try:
+                r = self.elastic._safe_put_bulk(url, bulk_json, headers=headers)
+                if r.status_code >= 500 and r.status_code not in self.RETRY_STATUS:
+                    r.raise_for_status()
+            except requests.exceptions.RequestException as ex:
+                if not self.spool_dir:
+                    raise
+                logger.warning("Bulk request to %s failed: %s", self.url, ex)
+                self._spool(chunks)
+                return lost == 0
+
+            if r.status_code in self.RETRY_STATUS:
+                # The whole pack has been rejected
+                rejected, failed = chunks, 0
+            else:
+                r.raise_for_status()
+                rejected, failed = self._check_response(decode(r.content), chunks)
+
+            self._adapt_size(time()-request_init, len(rejected) > 0)
+            self._count("sent", len(chunks) - len(rejected) - failed)
+            self._count("failed", failed)
+            lost += failed
+
+            if not rejected:
+                break
+            if retries >= self.elastic.bulk_max_retries and self.spool_dir:
+                self._spool(rejected)
+                break
+            if retries >= self.elastic.bulk_max_retries:
+                logger.error("%i documents dropped in %s after %i retries",
+                             len(rejected), self.url, retries)
+                self._count("dropped", len(rejected))
+                lost += len(rejected)
+                break
+
+            sleep(self.elastic.bulk_backoff_factor * (2 ** retries))
+            retries += 1
+            self._count("retried", len(rejected))
+            chunks = rejected
+
+        self._count("bytes", size)
+
+        logger.debug("bulk packet sent (%.2f sec, %i total, %.2f MB)"
+                     % (time()-task_init, self.total, size / (1024*1024)))
+
+        return lost == 0
+
+    def _check_response(self, rjson, chunks):
+        """ Find the documents not indexed in a bulk response
+
+        :returns: chunks rejected which could be retried and number of
+                  documents failed with other errors
+        """
+
+        rejected = []
+        failed = 0
+
+        if not rjson.get('errors'):
+            return rejected, failed
+
+        for chunk, item in zip(chunks, rjson['items']):
+            # The only key in item is the bulk action
+            result = list(item.values())[0]
+            if 'error' not in result:
+                continue
+            if result['status'] in self.RETRY_STATUS:
+                rejected.append(chunk)
+            else:
+                failed += 1
+                logger.debug("Document not indexed in %s: %s", self.url, result['error'])
+
+        if failed:
+            logger.error("%i documents failed in %s", failed, self.url)
+
+        return rejected, failed
+
+    def _spool(self, chunks):
+        """ Write a pack to the spool directory to be sent later """
+
+        with self.lock:
+            self.spooling = True
+            BulkWriter.spool_seq += 1
+            seq = BulkWriter.spool_seq
+
+        # Names sorted in the order the packs must be replayed
+        name = "%017.6f_%i_%06i" % (time(), os.getpid(), seq)
+        spool_file = os.path.join(self.spool_dir, name + self.SPOOL_EXT)
+        header = {"url": self.elastic.url, "index": self.elastic.index,
+                  "bulk_url": self.url}
+
+        os.makedirs(self.spool_dir, exist_ok=True)
+        with gzip.open(spool_file + ".tmp", "wb", self.COMPRESS_LEVEL) as f:
+            f.write(json.dumps(header).encode('utf-8') + b"\n")
+            for chunk in chunks:
+                f.write(chunk)
+        # Only complete packs are replayed
+        os.rename(spool_file + ".tmp", spool_file)
+
+        logger.warning("%i documents for %s spooled in %s", len(chunks),
+                       self.url, spool_file)
+        self._count("spooled", len(chunks))
+
+    def _adapt_size(self, latency, rejected):
+        """ Reduce the pack size under backpressure and grow it back after """
+
+        with self.lock:
+            max_items = self.max_items
+            if rejected or latency > self.elastic.bulk_max_latency:
+                max_items = min(self.max_items_limit,
+                                max(self.MIN_ITEMS, max_items // 2))
+            elif max_items < self.max_items_limit:
+                max_items = min(self.max_items_limit,
+                                max_items + max(1, self.max_items_limit // 10))
+
+            if max_items != self.max_items:
+                logger.debug("Bulk pack size changed from %i to %i items (%.2f sec)",
+                             self.max_items, max_items, latency)
+                self.max_items = max_items
+                self.elastic.bulk_size = max_items
+
+    def _count(self, stat, value):
+        with self.lock:
+            self.stats[stat] += value
+            self.elastic.bulk_stats[stat] += value
+
+
+def spooled_packs(spool_dir):
+    """ Packs waiting in the spool directory, in the order to replay them """
+
+    return sorted(glob.glob(os.path.join(spool_dir, "*" + BulkWriter.SPOOL_EXT)))
+
+
+def replay_spool(spool_dir):
+    """ Send to ElasticSearch the packs spooled by BulkWriter, in order
+
+    Each file is removed once its documents are indexed. The replay stops
+    in the first pack which can not be sent, so the order is kept.
+
+    :returns: number of documents indexed
+    :raises ElasticWriteException: if documents of a pack are not indexed
+    """
+
+    total = 0
+    spool_files = spooled_packs(spool_dir)
+
+    logger.info("Replaying %i spooled packs from %s", len(spool_files), spool_dir)
+
+    for spool_file in spool_files:
+        with gzip.open(spool_file, "rb") as f:
+            header = json.loads(f.readline().decode('utf-8'))
+            lines = f.read().splitlines(True)
+
+        # Spooling the same packs again is not useful
+        elastic = ElasticSearch(header["url"], header["index"])
+        elastic.bulk_spool_dir = None
+        elastic.requests_bulk = elastic.requests
+
+        bulk = BulkWriter(elastic, url=header["bulk_url"])
+        # Each bulk action is followed by its document
+        for pos in range(0, len(lines), 2):
+            bulk.add_chunk(lines[pos] + lines[pos + 1])
+        bulk.flush()
+
+        if bulk.stats["dropped"] or bulk.stats["failed"]:
+            # Keep the file to replay it again once the problem is fixed
+            logger.error("Replay of %s stopped: %i documents dropped and %i failed",
+                         spool_file, bulk.stats["dropped"], bulk.stats["failed"])
+            raise ElasticWriteException()
+
+        os.remove(spool_file)
+        total += bulk.total
+        logger.info("%i documents replayed from %s", bulk.total, spool_file)
+
+    return total
@@ -23,21 +23,25 @@
 #   Alvaro del Castillo San Felix <acs@bitergia.com>
 #
 
+import bisect
+import collections
 import json
 import functools
 import logging
+import multiprocessing
 import subprocess
-import sys
 
-from datetime import datetime as dt
+from datetime import datetime as dt, timedelta
 from os import path
 
-from dateutil import parser
 from functools import lru_cache
 
+from ..dates import parse_date
 from ..elastic_items import ElasticItems
+from ..progress import Progress
 
-from .utils import grimoire_con
+from .elastic import BulkWriter
+from .utils import config_http_pool, grimoire_con
 
 
 logger = logging.getLogger(__name__)
@@ -63,8 +67,35 @@ except ImportError:
 
 
 DEFAULT_PROJECT = 'Main'
+ENROLLMENTS_CACHE_SIZE = 4096  # uuids with their enrollments intervals kept
 DEFAULT_DB_USER = 'root'
 
+# Enricher used by the enrich worker processes
+_worker_enricher = None
+
+
+def _init_enrich_worker(enricher):
+    """ Prepare a forked process to enrich items with enricher """
+
+    global _worker_enricher
+
+    # Don't share the connections with the parent process
+    config_http_pool()
+    if Enrich.sh_db_args:
+        Enrich.sh_db = Database(*Enrich.sh_db_args)
+
+    _worker_enricher = enricher
+
+
+def _enrich_chunk(items, events=False):
+    """ Enriched documents of a chunk of items, in a worker process """
+
+    rich_docs = []
+    for item in items:
+        rich_docs.extend(_worker_enricher.get_rich_docs(item, events))
+
+    return rich_docs
+
 
 def metadata(func):
     """Add metadata to an item.
@@ -89,6 +120,14 @@ def metadata(func):
 class Enrich(ElasticItems):
 
     sh_db = None
+    sh_db_args = None  # to connect again to SortingHat in other processes
+    # Processes enriching the items in parallel, and items sent to each at once
+    enrich_workers = 1
+    enrich_chunk_size = 100
+    # Resume the enrichment from the checkpoint of the last raw item enriched
+    use_checkpoints = False
+    # SortingHat.updates when the enrollments intervals were built
+    enrollments_updates = 0
     RAW_FIELDS_COPY = ["metadata__updated_on", "metadata__timestamp",
                        "ocean-unique-id", "offset", "origin", "tag", "uuid"]
 
@@ -107,6 +146,7 @@ class Enrich(ElasticItems):
             # self.sh_db = Database("root", "", db_sortinghat, "mariadb")
             if not Enrich.sh_db:
                 Enrich.sh_db = Database(db_user, db_password, db_sortinghat, db_host)
+                Enrich.sh_db_args = (db_user, db_password, db_sortinghat, db_host)
             self.sortinghat = True
 
         self.prjs_map = None  # mapping beetween repositories and projects
@@ -135,6 +175,7 @@ class Enrich(ElasticItems):
         self.requests = grimoire_con()
         self.elastic = None
         self.type_name = "items"  # type inside the index to store items enriched
+        self.checkpoint = None  # EnrichCheckpoint saved as items are uploaded
 
         # To add the gelk version to enriched items
         try:
@@ -293,6 +334,11 @@ class Enrich(ElasticItems):
         """ Field in the raw item with the unique id """
         return "uuid"
 
+    def get_raw_source_filter(self):
+        """ _source filtering (includes and excludes lists) with the fields
+            of the raw items needed to enrich them. None for all fields. """
+        return None
+
     def get_field_event_unique_id(self):
         """ Field in the rich event with the unique id """
         raise NotImplementedError
@@ -310,64 +356,132 @@ class Enrich(ElasticItems):
         return self.enrich_items(items, events=True)
 
     def enrich_items(self, ocean_backend, events=False):
-        max_items = self.elastic.max_items_bulk
-        current = 0
         total = 0
-        bulk_json = ""
 
         items = ocean_backend.fetch()
 
-        url = self.elastic.index_url+'/items/_bulk'
+        bulk = BulkWriter(self.elastic)
+        progress = Progress("Enrich %s" % self.elastic.index_url,
+                            ocean_backend.fetch_total, bulk)
 
-        logger.debug("Adding items to %s (in %i packs)", url, max_items)
+        logger.debug("Adding items to %s (in %i packs)", bulk.url, bulk.max_items)
 
         if events:
             logger.debug("Adding events items")
 
-        for item in items:
-            if current >= max_items:
-                try:
-                    r = self.requests.put(url, data=bulk_json)
-                    r.raise_for_status()
-                    json_size = sys.getsizeof(bulk_json) / (1024*1024)
-                    logger.debug("Added %i items to %s (%0.2f MB)", total, url, json_size)
-                except UnicodeEncodeError:
-                    # Why is requests encoding the POST data as ascii?
-                    logger.error("Unicode error in enriched items")
-                    logger.debug(bulk_json)
-                    safe_json = str(bulk_json.encode('ascii', 'ignore'), 'ascii')
-                    self.requests.put(url, data=safe_json)
-                bulk_json = ""
-                current = 0
-
-            if not events:
-                rich_item = self.get_rich_item(item)
-                data_json = json.dumps(rich_item)
-                bulk_json += '{"index" : {"_id" : "%s" } }\n' % \
-                    (item[self.get_field_unique_id()])
-                bulk_json += data_json +"\n"  # Bulk document
-                current += 1
+        if self.checkpoint:
+            bulk.on_commit = self.checkpoint.save
+
+        if self.enrich_workers > 1:
+            batches = self.__enrich_parallel(ocean_backend, items, events)
+        else:
+            batches = self.__enrich_serial(ocean_backend, items, events)
+
+        for rich_docs, sort_key, done in batches:
+            for doc_id, rich_doc in rich_docs:
+                bulk.add(doc_id, rich_doc)
+                self.collect_rich_document(doc_id, rich_doc)
                 total += 1
-            else:
-                rich_events = self.get_rich_events(item)
-                for rich_event in rich_events:
-                    data_json = json.dumps(rich_event)
-                    bulk_json += '{"index" : {"_id" : "%s_%s" } }\n' % \
-                        (item[self.get_field_unique_id()],
-                         rich_event[self.get_field_event_unique_id()])
-                    bulk_json += data_json +"\n"  # Bulk document
-                    current += 1
-                    total += 1
+            if self.checkpoint:
+                bulk.mark(sort_key)
+            progress.update(done)
+
+        for doc_id, rich_doc in self.get_collected_documents():
+            bulk.add(doc_id, rich_doc)
+            total += 1
 
         if total == 0:
             # No items enriched, nothing to upload to ES
             return total
 
-        r = self.requests.put(url, data=bulk_json)
-        r.raise_for_status()
+        bulk.flush()
+        progress.finish()
 
         return total
 
+    def rich_documents(self, item):
+        """ Generate the (id, document) pairs enriched from a raw item
+
+            Backends creating several documents from an item override it.
+            It can be run in other processes, so it must not keep state
+            needed once all the items are enriched (see collect_rich_document).
+        """
+
+        yield item[self.get_field_unique_id()], self.get_rich_item(item)
+
+    def rich_event_documents(self, item):
+        """ Generate the (id, document) pairs of the events of a raw item """
+
+        for rich_event in self.get_rich_events(item):
+            yield ("%s_%s" % (item[self.get_field_unique_id()],
+                              rich_event[self.get_field_event_unique_id()]), rich_event)
+
+    def collect_rich_document(self, doc_id, rich_doc):
+        """ Called in the enrich process for each document uploaded, to build
+            documents with data from several items """
+
+        pass
+
+    def get_collected_documents(self):
+        """ (id, document) pairs to upload once all the items are enriched """
+
+        return []
+
+    def get_rich_docs(self, item, events=False):
+        """ Enriched documents of a raw item as a list of (id, document) """
+
+        if events:
+            return list(self.rich_event_documents(item))
+
+        return list(self.rich_documents(item))
+
+    def __enrich_serial(self, ocean_backend, items, events):
+        """ Generate the enriched documents of each item with the sort key
+            of the item and the number of items enriched (1) """
+
+        for item in items:
+            yield self.get_rich_docs(item, events), ocean_backend.last_sort_key, 1
+
+    def __enrich_parallel(self, ocean_backend, items, events):
+        """ Generate the enriched documents of chunks of items enriched in
+            enrich_workers processes, in the order of the items
+
+            The pool is created before reading the items, so no other
+            threads are running when the workers are forked. At most two
+            chunks per worker are read in advance.
+        """
+
+        context = multiprocessing.get_context("fork")
+        pool = context.Pool(self.enrich_workers, initializer=_init_enrich_worker,
+                            initargs=(self,))
+        pending = collections.deque()
+
+        try:
+            chunk = []
+            for item in items:
+                chunk.append(item)
+                if len(chunk) < self.enrich_chunk_size:
+                    continue
+                pending.append((pool.apply_async(_enrich_chunk, (chunk, events)),
+                                ocean_backend.last_sort_key, len(chunk)))
+                chunk = []
+                if len(pending) >= 2 * self.enrich_workers:
+                    result, sort_key, done = pending.popleft()
+                    yield result.get(), sort_key, done
+            if chunk:
+                pending.append((pool.apply_async(_enrich_chunk, (chunk, events)),
+                                ocean_backend.last_sort_key, len(chunk)))
+            while pending:
+                result, sort_key, done = pending.popleft()
+                yield result.get(), sort_key, done
+        except BaseException:
+            pool.terminate()
+            raise
+        else:
+            pool.close()
+        finally:
+            pool.join()
+
     def get_connector_name(self):
         """ Find the name for the current connector """
         from ..utils import get_connector_name
@@ -458,7 +572,7 @@ class Enrich(ElasticItems):
 
         grimoire_date = None
         try:
-            grimoire_date = parser.parse(creation_date).isoformat()
+            grimoire_date = parse_date(creation_date).isoformat()
         except Exception as ex:
             pass
 
@@ -555,23 +669,74 @@ class Enrich(ElasticItems):
             bot = u.profile.is_bot
         return bot
 
+    @staticmethod
+    def naive_utc(item_date):
+        """ Offset-naive UTC date for an item date, used to find enrollments """
+        if item_date and item_date.tzinfo:
+            item_date = (item_date-item_date.utcoffset()).replace(tzinfo=None)
+        return item_date
+
     def get_enrollment(self, uuid, item_date):
         """ Get the enrollment for the uuid when the item was done """
         # item_date must be offset-naive (utc)
-        if item_date and item_date.tzinfo:
-            item_date = (item_date-item_date.utcoffset()).replace(tzinfo=None)
+        item_date = self.naive_utc(item_date)
 
-        enrollments = self.get_enrollments(uuid)
-        enroll = self.unaffiliated_group
-        if len(enrollments) > 0:
-            for enrollment in enrollments:
-                if not item_date:
-                    enroll = enrollment.organization.name
-                    break
-                elif item_date >= enrollment.start and item_date <= enrollment.end:
-                    enroll = enrollment.organization.name
+        if Enrich.enrollments_updates != SortingHat.updates:
+            # Enrollments added to SortingHat after the intervals were built
+            self.__get_enrollments_intervals.cache_clear()
+            Enrich.enrollments_updates = SortingHat.updates
+
+        (starts, orgs, first_org) = self.__get_enrollments_intervals(uuid)
+
+        if not item_date:
+            return first_org if first_org is not None else self.unaffiliated_group
+
+        pos = bisect.bisect_right(starts, item_date) - 1
+        if pos < 0 or orgs[pos] is None:
+            return self.unaffiliated_group
+
+        return orgs[pos]
+
+    @lru_cache(maxsize=ENROLLMENTS_CACHE_SIZE)
+    def __get_enrollments_intervals(self, uuid):
+        """ Sorted intervals with the organization of the uuid in each of them
+
+        The enrollments are split in intervals which don't overlap, with
+        the organization of the first enrollment including them, so an
+        item date is found with a bisect giving the same organization as
+        checking the enrollments one by one. Returns the start dates of
+        the intervals, their organizations (None if there is no enrollment)
+        and the organization of the first enrollment.
+        """
+        enrollments = [(enrollment.start, enrollment.end, enrollment.organization.name)
+                       for enrollment in self.get_enrollments(uuid)]
+        if not enrollments:
+            return ([], [], None)
+
+        # Ends are included in the enrollments
+        bounds = set()
+        for (start, end, _) in enrollments:
+            bounds.add(start)
+            try:
+                bounds.add(end + timedelta(microseconds=1))
+            except OverflowError:
+                pass
+
+        starts = []
+        orgs = []
+        for bound in sorted(bounds):
+            org = None
+            for (start, end, name) in enrollments:
+                if start <= bound <= end:
+                    org = name
                     break
-        return enroll
+            if orgs and orgs[-1] == org:
+                # Same organization as the previous interval: join them
+                continue
+            starts.append(bound)
+            orgs.append(org)
+
+        return (starts, orgs, enrollments[0][2])
 
     def __get_item_sh_fields_empty(self, rol):
         """ Return a SH identity with all fields to empty_field """
@@ -651,7 +816,8 @@ class Enrich(ElasticItems):
         if not roles:
             roles = [author_field]
 
-        date = parser.parse(eitem[self.get_field_date()])
+        # Converted once for the enrollments of all roles
+        date = self.naive_utc(parse_date(eitem[self.get_field_date()]))
 
         for rol in roles:
             if rol+"_id" not in eitem:
@@ -700,9 +866,11 @@ class Enrich(ElasticItems):
             roles = [author_field]
 
         if not date_field:
-            item_date = parser.parse(item[self.get_field_date()])
+            item_date = parse_date(item[self.get_field_date()])
         else:
-            item_date = parser.parse(item[date_field])
+            item_date = parse_date(item[date_field])
+        # Converted once for the enrollments of all roles
+        item_date = self.naive_utc(item_date)
 
         users_data = self.get_users_data(item)
 
@@ -719,7 +887,6 @@ class Enrich(ElasticItems):
 
         return eitem_sh
 
-    @lru_cache()
     def get_enrollments(self, uuid):
         return api.enrollments(self.sh_db, uuid)
 
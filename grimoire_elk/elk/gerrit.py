@@ -24,11 +24,11 @@
 #
 
 from datetime import datetime
-from dateutil import parser
 import json
 import logging
 import time
 
+from ..dates import parse_date
 from .enrich import Enrich, metadata
 
 
@@ -43,6 +43,10 @@ class GerritEnrich(Enrich):
     def get_fields_uuid(self):
         return ["review_uuid", "patchSet_uuid", "approval_uuid"]
 
+    def get_raw_source_filter(self):
+        # Files and inline comments in patchsets are not enriched
+        return {"excludes": ["data.patchSets.files", "data.patchSets.comments"]}
+
     def get_sh_identity(self, item, identity_field=None):
         identity = {}
         for field in ['name', 'email', 'username']:
@@ -185,10 +189,10 @@ class GerritEnrich(Enrich):
         eitem["patchsets"] = len(review["patchSets"])
 
         # Time to add the time diffs
-        createdOn_date = parser.parse(review['createdOn'])
+        createdOn_date = parse_date(review['createdOn'])
         if len(review["patchSets"]) > 0:
-            createdOn_date = parser.parse(review["patchSets"][0]['createdOn'])
-        lastUpdated_date = parser.parse(review['lastUpdated'])
+            createdOn_date = parse_date(review["patchSets"][0]['createdOn'])
+        lastUpdated_date = parse_date(review['lastUpdated'])
         seconds_day = float(60*60*24)
         if eitem['status'] in ['MERGED','ABANDONED']:
             timeopen = \
@@ -26,12 +26,12 @@ import json
 import logging
 import re
 import time
-import sys
 
 import requests
 
-from dateutil import parser
-
+from ..dates import parse_date
+from .. import query
+from ..codec import decode
 from .enrich import Enrich, metadata
 
 try:
@@ -303,8 +303,8 @@ class GitEnrich(Enrich):
                 eitem[map_fields[fn]] = None
         eitem['hash_short'] = eitem['hash'][0:6]
         # Enrich dates
-        author_date = parser.parse(commit["AuthorDate"])
-        commit_date = parser.parse(commit["CommitDate"])
+        author_date = parse_date(commit["AuthorDate"])
+        commit_date = parse_date(commit["CommitDate"])
         eitem["author_date"] = author_date.replace(tzinfo=None).isoformat()
         eitem["commit_date"] = commit_date.replace(tzinfo=None).isoformat()
         eitem["utc_author"] = (author_date-author_date.utcoffset()).replace(tzinfo=None).isoformat()
@@ -419,124 +419,64 @@ class GitEnrich(Enrich):
             eitem.update(get_pair_programming_metrics(eitem, nauthors))
         return eitem
 
-    def enrich_items(self, ocean_backend, events=False):
+    def rich_documents(self, item):
         """ Implementation supporting signed-off and multiauthor/committer commits.
         """
 
-        max_items = self.elastic.max_items_bulk
-        current = 0
-        total = 0
-        bulk_json = ""
-
-        total_signed_off = 0
-        total_multi_author = 0
-
-        url = self.elastic.index_url+'/items/_bulk'
-
-        logger.debug("Adding items to %s (in %i packs)", url, max_items)
-
-        items = ocean_backend.fetch()
-
-        for item in items:
-
-            if self.CLOUDFOUNDRY_URL in item['origin']:
-                self.pair_programming = True
-
-            if self.pair_programming:
-                # First we need to add the authors field to all commits
-                # Check multi author
-                m = self.AUTHOR_P2P_REGEX.match(item['data']['Author'])
-                if m:
-                    logger.debug("Multiauthor detected. Creating one commit " +
-                                 "per author: %s", item['data']['Author'])
-                    item['data']['authors'] = self.__get_authors(item['data']['Author'])
-                    item['data']['Author'] = item['data']['authors'][0]
-                m = self.AUTHOR_P2P_REGEX.match(item['data']['Commit'])
-                if m:
-                    logger.debug("Multicommitter detected: using just the first committer")
-                    item['data']['committers'] = self.__get_authors(item['data']['Commit'])
-                    item['data']['Commit'] = item['data']['committers'][0]
-                # Add the authors list using the original Author and the Signed-off list
-                if 'Signed-off-by' in item['data']:
-                    authors_all = item['data']['Signed-off-by']+[item['data']['Author']]
-                    item['data']['authors_signed_off'] = list(set(authors_all))
-
-            if current >= max_items:
-                try:
-                    r = self.requests.put(url, data=bulk_json)
-                    r.raise_for_status()
-                    json_size = sys.getsizeof(bulk_json) / (1024*1024)
-                    logger.debug("Added %i items to %s (%0.2f MB)", total, url, json_size)
-                except UnicodeEncodeError:
-                    # Why is requests encoding the POST data as ascii?
-                    logger.error("Unicode error in enriched items")
-                    logger.debug(bulk_json)
-                    safe_json = str(bulk_json.encode('ascii', 'ignore'), 'ascii')
-                    self.requests.put(url, data=safe_json)
-                bulk_json = ""
-                current = 0
-
-            rich_item = self.get_rich_item(item)
-            data_json = json.dumps(rich_item)
-            bulk_json += '{"index" : {"_id" : "%s" } }\n' % \
-                (item[self.get_field_unique_id()])
-            bulk_json += data_json +"\n"  # Bulk document
-            current += 1
-            total += 1
-
-            if self.pair_programming:
-                # Multi author support
-                if 'authors' in item['data']:
-                    # First author already added in the above commit
-                    authors = item['data']['authors']
-                    for i in range(1, len(authors)):
-                        # logger.debug('Adding a new commit for %s', authors[i])
-                        item['data']['Author'] = authors[i]
-                        item['data']['is_git_commit_multi_author'] = 1
-                        rich_item = self.get_rich_item(item)
-                        commit_id = item[self.get_field_unique_id()] + "_" + str(i-1)
-                        data_json = json.dumps(rich_item)
-                        bulk_json += '{"index" : {"_id" : "%s" } }\n' % commit_id
-                        bulk_json += data_json +"\n"  # Bulk document
-                        current += 1
-                        total += 1
-                        total_multi_author += 1
-
-                if rich_item['Signed-off-by_number'] > 0:
-                    nsg = 0
-                    # Remove duplicates and the already added Author if exists
-                    authors = list(set(item['data']['Signed-off-by']))
-                    if item['data']['Author'] in authors:
-                        authors.remove(item['data']['Author'])
-                    for author in authors:
-                        # logger.debug('Adding a new commit for %s', author)
-                        # Change the Author in the original commit and generate
-                        # a new enriched item with it
-                        item['data']['Author'] = author
-                        item['data']['is_git_commit_signed_off'] = 1
-                        rich_item = self.get_rich_item(item)
-                        commit_id = item[self.get_field_unique_id()] + "_" + str(nsg)
-                        data_json = json.dumps(rich_item)
-                        bulk_json += '{"index" : {"_id" : "%s" } }\n' % commit_id
-                        bulk_json += data_json +"\n"  # Bulk document
-                        current += 1
-                        total += 1
-                        total_signed_off += 1
-                        nsg += 1
-
-        if total == 0:
-            # No items enriched, nothing to upload to ES
-            return total
-
-        r = self.requests.put(url, data=bulk_json)
-        r.raise_for_status()
+        if self.CLOUDFOUNDRY_URL in item['origin']:
+            self.pair_programming = True
 
         if self.pair_programming:
-            logger.info("Signed-off commits generated: %i", total_signed_off)
-            logger.info("Multi author commits generated: %i", total_multi_author)
-
-        return total
+            # First we need to add the authors field to all commits
+            # Check multi author
+            m = self.AUTHOR_P2P_REGEX.match(item['data']['Author'])
+            if m:
+                logger.debug("Multiauthor detected. Creating one commit " +
+                             "per author: %s", item['data']['Author'])
+                item['data']['authors'] = self.__get_authors(item['data']['Author'])
+                item['data']['Author'] = item['data']['authors'][0]
+            m = self.AUTHOR_P2P_REGEX.match(item['data']['Commit'])
+            if m:
+                logger.debug("Multicommitter detected: using just the first committer")
+                item['data']['committers'] = self.__get_authors(item['data']['Commit'])
+                item['data']['Commit'] = item['data']['committers'][0]
+            # Add the authors list using the original Author and the Signed-off list
+            if 'Signed-off-by' in item['data']:
+                authors_all = item['data']['Signed-off-by']+[item['data']['Author']]
+                item['data']['authors_signed_off'] = list(set(authors_all))
+
+        rich_item = self.get_rich_item(item)
+        yield item[self.get_field_unique_id()], rich_item
 
+        if self.pair_programming:
+            # Multi author support
+            if 'authors' in item['data']:
+                # First author already added in the above commit
+                authors = item['data']['authors']
+                for i in range(1, len(authors)):
+                    # logger.debug('Adding a new commit for %s', authors[i])
+                    item['data']['Author'] = authors[i]
+                    item['data']['is_git_commit_multi_author'] = 1
+                    rich_item = self.get_rich_item(item)
+                    commit_id = item[self.get_field_unique_id()] + "_" + str(i-1)
+                    yield commit_id, rich_item
+
+            if rich_item['Signed-off-by_number'] > 0:
+                nsg = 0
+                # Remove duplicates and the already added Author if exists
+                authors = list(set(item['data']['Signed-off-by']))
+                if item['data']['Author'] in authors:
+                    authors.remove(item['data']['Author'])
+                for author in authors:
+                    # logger.debug('Adding a new commit for %s', author)
+                    # Change the Author in the original commit and generate
+                    # a new enriched item with it
+                    item['data']['Author'] = author
+                    item['data']['is_git_commit_signed_off'] = 1
+                    rich_item = self.get_rich_item(item)
+                    commit_id = item[self.get_field_unique_id()] + "_" + str(nsg)
+                    yield commit_id, rich_item
+                    nsg += 1
 
     def enrich_demography(self, from_date=None):
         logger.info("Doing demography enrich from %s since %s",
@@ -545,60 +485,22 @@ class GitEnrich(Enrich):
         date_field = self.get_incremental_date()
 
         # Don't use commits before DEMOGRAPHY_COMMIT_MIN_DATE
-        filters = '''
-        {"range":
-            {"%s": {"gte": "%s"}}
-        }
-        ''' % (date_field, DEMOGRAPHY_COMMIT_MIN_DATE)
+        filters = [query.range_gte(date_field, DEMOGRAPHY_COMMIT_MIN_DATE)]
 
         if from_date:
-            from_date = from_date.isoformat()
-
-            filters += '''
-            ,
-            {"range":
-                {"%s": {"gte": "%s"}}
-            }
-            ''' % (date_field, from_date)
-
-        query = """
-        "query": {
-            "bool": {
-                "must": [%s]
-            }
-        },
-        """ % (filters)
-
+            filters.append(query.range_gte(date_field, from_date.isoformat()))
 
         # First, get the min and max commit date for all the authors
         # Limit aggregations: https://github.com/elastic/elasticsearch/issues/18838
         # 10000 seems to be a sensible number of the number of people in git
-        es_query = """
-        {
-          %s
-          "size": 0,
-          "aggs": {
-            "author": {
-              "terms": {
-                "field": "Author",
-                "size": 10000
-              },
-              "aggs": {
-                "min": {
-                  "min": {
-                    "field": "utc_commit"
-                  }
-                },
-                "max": {
-                  "max": {
-                    "field": "utc_commit"
-                  }
-                }
-              }
-            }
-          }
+        aggs = {
+            "author": query.terms_agg("Author", 10000, {
+                "min": query.min_agg("utc_commit"),
+                "max": query.max_agg("utc_commit")
+            })
         }
-        """ % (query)
+        es_query = json.dumps(query.search(query=query.bool_query(must=filters),
+                                           size=0, aggs=aggs))
 
         logger.debug(es_query)
 
@@ -614,36 +516,20 @@ class GitEnrich(Enrich):
 
         author_items = []  # items from author with new date fields added
         nauthors_done = 0
-        author_query = """
-        {
-            "query": {
-                "bool": {
-                    "must": [
-                        {"term":
-                            { "Author" : ""  }
-                        }
-                        ]
-                }
-            }
-
-        }
-        """
-        author_query_json = json.loads(author_query)
-
-
         for author in authors:
             # print("%s: %s %s" % (author['key'], author['min']['value_as_string'], author['max']['value_as_string']))
             # Time to add all the commits (items) from this author
-            author_query_json['query']['bool']['must'][0]['term']['Author'] = author['key']
-            author_query_str = json.dumps(author_query_json)
-            r = self.requests.post(self.elastic.index_url+"/_search?size=10000", data=author_query_str, verify=False)
+            author_query = json.dumps(query.search(
+                query=query.bool_query(must=[query.term("Author", author['key'])])))
+            r = self.requests.post(self.elastic.index_url+"/_search?size=10000", data=author_query, verify=False)
 
-            if "hits" not in r.json():
+            rjson = decode(r.content)
+            if "hits" not in rjson:
                 logger.error("Can't find commits for %s", author['key'])
-                logger.error(r.json())
+                logger.error(rjson)
                 logger.error(author_query)
                 continue
-            for item in r.json()["hits"]["hits"]:
+            for item in rjson["hits"]["hits"]:
                 new_item = item['_source']
                 new_item["author_max_date"] = author['max']['value_as_string']
                 if "author_min_date" not in new_item or not new_item['author_min_date']:
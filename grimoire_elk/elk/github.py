@@ -23,16 +23,14 @@
 #   Alvaro del Castillo San Felix <acs@bitergia.com>
 #
 
-import json
 import logging
 import re
 
 from datetime import datetime
 
-from dateutil import parser
-
 from .utils import get_time_diff_days
 
+from .elastic import BulkWriter
 from .enrich import Enrich, metadata
 
 
@@ -177,35 +175,23 @@ class GitHubEnrich(Enrich):
         return self.get_github_cache("geolocations", "location")
 
     def geo_locations_to_es(self):
-        max_items = self.elastic.max_items_bulk
-        current = 0
-        bulk_json = ""
-
         url = self.elastic.url + "/github/geolocations/_bulk"
+        bulk = BulkWriter(self.elastic, url=url)
 
-        logger.debug("Adding geoloc to %s (in %i packs)" % (url, max_items))
+        logger.debug("Adding geoloc to %s (in %i packs)" % (url, bulk.max_items))
 
 
         for loc in self.geolocations:
-            if current >= max_items:
-                self.requests.put(url, data=bulk_json)
-                bulk_json = ""
-                current = 0
-
             geopoint = self.geolocations[loc]
             location = geopoint.copy()
             location["location"] = loc
-            # First upload the raw issue data to ES
-            data_json = json.dumps(location)
             # Don't include in URL non ascii codes
             safe_loc = str(loc.encode('ascii', 'ignore'),'ascii')
             geo_id = str("%s-%s-%s" % (location["lat"], location["lon"],
                                        safe_loc))
-            bulk_json += '{"index" : {"_id" : "%s" } }\n' % (geo_id)
-            bulk_json += data_json +"\n"  # Bulk document
-            current += 1
+            bulk.add(geo_id, location)
 
-        self.requests.put(url, data = bulk_json)
+        bulk.flush()
 
         logger.debug("Adding geoloc to ES Done")
 
@@ -346,6 +332,15 @@ class GitHubEnrich(Enrich):
 
         return rich_issue
 
+    def collect_rich_document(self, doc_id, rich_doc):
+        # get_geo_point caches the geolocations in the enrich worker processes,
+        # so they are gathered here to upload them in geo_locations_to_es
+        for rol in ['user', 'assignee']:
+            location = rich_doc.get(rol + '_location')
+            geo_point = rich_doc.get(rol + '_geolocation')
+            if location and geo_point:
+                self.geolocations[location] = geo_point
+
     def enrich_items(self, items):
         total = super(GitHubEnrich, self).enrich_items(items)
 
@@ -25,8 +25,7 @@
 import csv
 import logging
 
-from dateutil import parser
-
+from ..dates import parse_date
 from .enrich import Enrich, metadata
 
 
@@ -195,7 +194,7 @@ class JenkinsEnrich(Enrich):
         eitem['job_build'] = eitem['job_name']+'/'+str(eitem['build'])
 
         # Enrich dates
-        eitem["build_date"] = parser.parse(item["metadata__updated_on"]).isoformat()
+        eitem["build_date"] = parse_date(item["metadata__updated_on"]).isoformat()
 
         # Add duration in days
         if "duration" in eitem:
@@ -26,8 +26,7 @@ import logging
 
 from datetime import datetime
 
-from dateutil import parser
-
+from ..dates import parse_date
 from .utils import get_time_diff_days
 
 logger = logging.getLogger(__name__)
@@ -270,7 +269,7 @@ def kafka_kip(enrich):
                 # It is not a KIP message
                 continue
             kip = eitem["kip"]
-            kip_date = parser.parse(eitem["email_date"])
+            kip_date = parse_date(eitem["email_date"])
 
             if eitem['kip_is_discuss']:
                 kip_fields["kip_discuss_time_days"] = \
@@ -385,7 +384,7 @@ def kafka_kip(enrich):
             if kip not in enrich.kips_scores:
                 enrich.kips_scores[kip] = []
 
-            kip_date = parser.parse(eitem["email_date"])
+            kip_date = parse_date(eitem["email_date"])
 
             # Analyze the subject to fill the kip fields
             if '[discuss]' in eitem['Subject'].lower() or \
@@ -22,11 +22,9 @@
 #   Alvaro del Castillo San Felix <acs@bitergia.com>
 #
 
-import json
 import logging
 
-from dateutil import parser
-
+from ..dates import parse_date
 from .enrich import Enrich, metadata
 
 
@@ -100,7 +98,7 @@ class MediaWikiEnrich(Enrich):
         """ Add sorting hat enrichment fields for the author of the revision """
 
         identity  = self.get_sh_identity(revision)
-        update =  parser.parse(item[self.get_field_date()])
+        update =  parse_date(item[self.get_field_date()])
         erevision = self.get_item_sh_fields(identity, update)
 
         return erevision
@@ -184,7 +182,7 @@ class MediaWikiEnrich(Enrich):
             eitem[map_fields[fn]] = page[fn]
 
         # Enrich dates
-        eitem["update_date"] = parser.parse(item["metadata__updated_on"]).isoformat()
+        eitem["update_date"] = parse_date(item["metadata__updated_on"]).isoformat()
         # Revisions
         eitem["last_edited_date"] = None
         eitem["nrevisions"] = 0
@@ -202,38 +200,10 @@ class MediaWikiEnrich(Enrich):
 
         return eitem
 
-    def enrich_items(self, items):
-        if True:
-            # Hack: by default we use events in MediaWiki
-            return self.enrich_events(items)
-        else:
-            super(MediaWikiEnrich, self).enrich_items(items)
-
-
-    def enrich_events(self, ocean_backend):
-        max_items = self.elastic.max_items_bulk
-        current = 0
-        bulk_json = ""
-        total = 0
-
-        url = self.elastic.index_url+'/items/_bulk'
-
-        logger.debug("Adding items to %s (in %i packs)" % (url, max_items))
-
-        items = ocean_backend.fetch()
-        for item in items:
-            rich_item_reviews = self.get_rich_item_reviews(item)
-            for enrich_review in rich_item_reviews:
-                if current >= max_items:
-                    self.requests.put(url, data=bulk_json)
-                    bulk_json = ""
-                    current = 0
-                data_json = json.dumps(enrich_review)
-                bulk_json += '{"index" : {"_id" : "%s" } }\n' % \
-                    (enrich_review[self.get_field_unique_id_review()])
-                bulk_json += data_json +"\n"  # Bulk document
-                current += 1
-                total += 1
-        self.requests.put(url, data = bulk_json)
-
-        return total
+    def rich_documents(self, item):
+        # By default we use events (page reviews) in MediaWiki
+        for enrich_review in self.get_rich_item_reviews(item):
+            yield enrich_review[self.get_field_unique_id_review()], enrich_review
+
+    def rich_event_documents(self, item):
+        return self.rich_documents(item)
@@ -320,28 +320,11 @@ class MeetupEnrich(Enrich):
     def get_field_unique_id_rsvps(self):
         return "id"
 
-    def enrich_items(self, ocean_backend):
-        items = ocean_backend.fetch()
-
-        super(MeetupEnrich, self).enrich_items(ocean_backend)
+    def rich_documents(self, item):
+        yield item[self.get_field_unique_id()], self.get_rich_item(item)
 
         # And now for each item we want also the rsvps and comments items
-        items = ocean_backend.fetch()
-        ncom = 0
-        nrsvps = 0
-        rich_item_comments = []
-        rich_item_rsvps = []
-
-        for item in items:
-            rich_item_comments += self.get_rich_item_comments(item)
-            rich_item_rsvps += self.get_rich_item_rsvps(item)
-
-        if rich_item_comments:
-            ncom += self.elastic.bulk_upload(rich_item_comments,
-                                             self.get_field_unique_id_comment())
-        if rich_item_rsvps:
-            nrsvps += self.elastic.bulk_upload(rich_item_rsvps,
-                                               self.get_field_unique_id_rsvps())
-
-        logger.info("Total comments enriched: %i", ncom)
-        logger.info("Total nrsvps enriched: %i", nrsvps)
+        for comment in self.get_rich_item_comments(item):
+            yield comment[self.get_field_unique_id_comment()], comment
+        for rsvp in self.get_rich_item_rsvps(item):
+            yield rsvp[self.get_field_unique_id_rsvps()], rsvp
@@ -25,8 +25,7 @@
 import json
 import logging
 
-from dateutil import parser
-
+from ..dates import parse_date
 from .enrich import Enrich, metadata
 
 
@@ -107,7 +106,7 @@ class RSSEnrich(Enrich):
                 eitem[map_fields[f]] = entry[f]
 
         # Enrich dates
-        eitem["publish_date"] = parser.parse(eitem["published"]).isoformat()
+        eitem["publish_date"] = parse_date(eitem["published"]).isoformat()
 
         if self.sortinghat:
             eitem.update(self.get_item_sh(item))
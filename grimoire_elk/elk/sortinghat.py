@@ -38,6 +38,9 @@ logger = logging.getLogger(__name__)
 
 class SortingHat(object):
 
+    # Enrollments added in this process, to know when the cached ones are old
+    updates = 0
+
     @classmethod
     def get_uuid_from_id(cls, db, sh_id):
         uuid = None
@@ -102,6 +105,7 @@ class SortingHat(object):
                 api.add_enrollment(db, uuid, identity['company'],
                                    datetime(1900, 1, 1),
                                    datetime(2100, 1, 1))
+                cls.updates += 1
             except AlreadyExistsError:
                 pass
 
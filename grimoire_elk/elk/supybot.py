@@ -25,8 +25,7 @@
 import json
 import logging
 
-from dateutil import parser
-
+from ..dates import parse_date
 from .enrich import Enrich, metadata
 
 
@@ -111,7 +110,7 @@ class SupybotEnrich(Enrich):
             eitem[map_fields[fn]] = message[fn]
 
         # Enrich dates
-        eitem["update_date"] = parser.parse(item["metadata__updated_on"]).isoformat()
+        eitem["update_date"] = parse_date(item["metadata__updated_on"]).isoformat()
         eitem["channel"] = eitem["origin"]
 
         eitem.update(self.get_grimoire_fields(eitem["update_date"], "message"))
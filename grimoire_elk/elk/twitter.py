@@ -24,8 +24,7 @@
 
 import logging
 
-from dateutil import parser
-
+from ..dates import parse_date
 from .enrich import Enrich, metadata, DEFAULT_PROJECT
 
 
@@ -133,7 +132,7 @@ class TwitterEnrich(Enrich):
             else:
                 eitem[f] = None
         # Date fields
-        eitem["created_at"]  = parser.parse(tweet["created_at"]).isoformat()
+        eitem["created_at"]  = parse_date(tweet["created_at"]).isoformat()
         # Fields which names are translated
         map_fields = {"@timestamp": "timestamp",
                       "@version": "version"
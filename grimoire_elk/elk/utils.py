@@ -24,21 +24,28 @@
 #
 
 import datetime
-import json
 import logging
+import threading
 
 import requests
 
 from requests.packages.urllib3.util.retry import Retry
 from requests.packages.urllib3.exceptions import InsecureRequestWarning
 
-from dateutil import parser, tz
+from dateutil import tz
+
+from ..dates import parse_date
+from .. import query
 
 
 logger = logging.getLogger(__name__)
 
 
 
+# Backends whose repositories are filtered by tag instead of origin
+TAG_FILTER_BACKENDS = ["meetup", "nntp", "stackexchange", "jira"]
+
+
 def get_repository_filter(perceval_backend, perceval_backend_name,
                           term=False):
     """ Get the filter needed for get the items in a repository """
@@ -50,7 +57,7 @@ def get_repository_filter(perceval_backend, perceval_backend_name,
     field = 'origin'
     value = perceval_backend.origin
 
-    if perceval_backend_name in ["meetup", "nntp", "stackexchange", "jira"]:
+    if perceval_backend_name in TAG_FILTER_BACKENDS:
         # Until tag is supported in all raw and enriched indexes
         # we should use origin. But stackexchange and meetup won't work with origin
         # because the tag must be included in the filter.
@@ -64,13 +71,7 @@ def get_repository_filter(perceval_backend, perceval_backend_name,
             filter_ = {"name": field,
                        "value": value}
         else:
-            filter_ = '''
-                {"term":
-                    { "%s" : "%s"  }
-                }
-            ''' % (field, value)
-            # Filters are always a dict
-            filter_ = json.loads(filter_)
+            filter_ = query.term(field, value)
 
     if value == '':
         # Support for getting all items from a multiorigin index
@@ -85,9 +86,9 @@ def get_time_diff_days(start, end):
         return None
 
     if type(start) is not datetime.datetime:
-        start = parser.parse(start).replace(tzinfo=None)
+        start = parse_date(start).replace(tzinfo=None)
     if type(end) is not datetime.datetime:
-        end = parser.parse(end).replace(tzinfo=None)
+        end = parse_date(end).replace(tzinfo=None)
 
     seconds_day = float(60*60*24)
     diff_days = \
@@ -111,18 +112,62 @@ def unixtime_to_datetime(ut):
     dt = dt.replace(tzinfo=tz.tzutc())
     return dt
 
-def grimoire_con(insecure=True, conn_retries=12):
-    conn = requests.Session()
-    # conn_retries = 12  # 800s
+# HTTP connections shared by all the ES clients in the process
+HTTP_POOL_SIZE = 10  # connections kept alive for each ES url
+HTTP_KEEP_ALIVE = True
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def _mount_pool(conn, conn_retries, read_retries):
     # Retry when there are errors in HTTP connections
-    retries = Retry(connect=conn_retries, read=8, redirect=5, backoff_factor=0.2,
-                    method_whitelist=False)
-    adapter = requests.adapters.HTTPAdapter(max_retries=retries)
+    retries = Retry(connect=conn_retries, read=read_retries, redirect=5,
+                    backoff_factor=0.2, method_whitelist=False)
+    # urllib3 keeps a different pool for each host (ES url) used
+    adapter = requests.adapters.HTTPAdapter(max_retries=retries,
+                                            pool_maxsize=HTTP_POOL_SIZE)
     conn.mount('http://', adapter)
     conn.mount('https://', adapter)
 
-    if insecure:
-        requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
-        conn.verify = False
+    if HTTP_KEEP_ALIVE:
+        conn.headers['Connection'] = 'keep-alive'
+    else:
+        conn.headers['Connection'] = 'close'
+
+
+def config_http_pool(pool_size=None, keep_alive=None):
+    """ Configure the connections pool of all the HTTP sessions, the already
+        created ones included """
+
+    global HTTP_POOL_SIZE, HTTP_KEEP_ALIVE
+
+    with _sessions_lock:
+        if pool_size:
+            HTTP_POOL_SIZE = pool_size
+        if keep_alive is not None:
+            HTTP_KEEP_ALIVE = keep_alive
+        for (insecure, conn_retries, read_retries), conn in _sessions.items():
+            _mount_pool(conn, conn_retries, read_retries)
+
+
+def grimoire_con(insecure=True, conn_retries=12, read_retries=8):
+    """ Return the HTTP session shared in the process for these options """
+
+    key = (insecure, conn_retries, read_retries)
+
+    with _sessions_lock:
+        if key in _sessions:
+            return _sessions[key]
+
+        conn = requests.Session()
+        # conn_retries = 12  # 800s
+        _mount_pool(conn, conn_retries, read_retries)
+
+        if insecure:
+            requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
+            conn.verify = False
+
+        _sessions[key] = conn
 
     return conn
@@ -31,8 +31,10 @@ import json
 import logging
 
 from datetime import datetime
+from ..elk.elastic import BulkWriter, REFRESH_END
 from ..elk.utils import unixtime_to_datetime, get_repository_filter
 from ..elastic_items import ElasticItems
+from ..progress import Progress
 
 
 logger = logging.getLogger(__name__)
@@ -59,6 +61,10 @@ class ElasticOcean(ElasticItems):
 
         self.fetch_cache = fetch_cache  # fetch from cache
         self.project = project  # project to be used for this data source
+        # Items added and dropped in the last feed, with the date and
+        # offset of its last item, to be kept in the Ocean state
+        self.feed_stats = {"items": 0, "dropped": 0, "last_update": None,
+                           "last_offset": None}
 
 
     def set_elastic(self, elastic):
@@ -127,8 +133,12 @@ class ElasticOcean(ElasticItems):
         # Also add timestamp used in incremental enrichment
         item['metadata__timestamp'] = timestamp.isoformat()
 
-    def feed(self, from_date=None, from_offset=None, category=None):
-        """ Feed data in Elastic from Perceval """
+    def feed(self, from_date=None, from_offset=None, category=None,
+             refresh=REFRESH_END):
+        """ Feed data in Elastic from Perceval
+
+            :refresh: when to make the items visible in searches
+        """
 
         if from_date and from_offset:
             raise RuntimeError("Can't not feed using from_date and from_offset.")
@@ -165,7 +175,6 @@ class ElasticOcean(ElasticItems):
 
         task_init = datetime.now()
 
-        items_pack = []  # to feed item in packs
         drop = 0
         added = 0
         if self.fetch_cache:
@@ -191,6 +200,16 @@ class ElasticOcean(ElasticItems):
                 else:
                     items = self.perceval_backend.fetch()
 
+        field_id = self.get_field_unique_id()
+        bulk = BulkWriter(self.elastic, refresh=refresh)
+        # The items to be fetched from the data source are not known
+        progress = Progress("Feed %s" % self.elastic.index_url, bulk=bulk)
+
+        logger.info("Adding items to Ocean for %s", self)
+
+        last_updated_on = None
+        last_offset = None
+
         for item in items:
             # print("%s %s" % (item['url'], item['lastUpdated_date']))
             # Add date field for incremental analysis if needed
@@ -198,15 +217,25 @@ class ElasticOcean(ElasticItems):
             self._fix_item(item)
             if self.project:
                 item['project'] = self.project
-            if len(items_pack) >= self.elastic.max_items_bulk:
-                self._items_to_es(items_pack)
-                items_pack = []
             if not self.drop_item(item):
-                items_pack.append(item)
+                bulk.add(item[field_id], item)
                 added += 1
             else:
                 drop +=1
-        self._items_to_es(items_pack)
+            # Items are not always fetched in date or offset order
+            if last_updated_on is None or item['updated_on'] > last_updated_on:
+                last_updated_on = item['updated_on']
+            if item.get('offset') is not None:
+                if last_offset is None or item['offset'] > last_offset:
+                    last_offset = item['offset']
+            progress.update()
+        bulk.flush()
+        progress.finish()
+
+        self.feed_stats = {"items": added, "dropped": drop, "last_update": None,
+                           "last_offset": last_offset}
+        if last_updated_on is not None:
+            self.feed_stats["last_update"] = unixtime_to_datetime(last_updated_on).isoformat()
 
 
         total_time_min = (datetime.now()-task_init).total_seconds()/60
@@ -218,7 +247,7 @@ class ElasticOcean(ElasticItems):
         return self
 
 
-    def _items_to_es(self, json_items):
+    def _items_to_es(self, json_items, refresh=REFRESH_END):
         """ Append items JSON to ES (data source state) """
 
         if len(json_items) == 0:
@@ -229,4 +258,4 @@ class ElasticOcean(ElasticItems):
 
         field_id = self.get_field_unique_id()
 
-        self.elastic.bulk_upload_sync(json_items, field_id)
+        self.elastic.bulk_upload(json_items, field_id, refresh=refresh)
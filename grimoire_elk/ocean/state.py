@@ -0,0 +1,197 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# State of the repositories fed into the raw indexes
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+# Authors:
+#   Alvaro del Castillo San Felix <acs@bitergia.com>
+#
+
+'''Ocean state manager (singleton)
+
+One document per raw index and origin with the arguments used to feed it
+and the result of the last feed: last item date and offset, items fed,
+duration, errors and the uuid of the index fed. It is written at once when the feed ends, and read
+with a single GET to know where the next incremental feed starts.
+
+The repositories in the configuration of previous versions (conf/repos)
+are listed too until they are fed again. They have the same ids.
+'''
+
+import logging
+
+from .. import query
+from ..codec import encode, decode
+from ..elk.utils import grimoire_con
+
+
+logger = logging.getLogger(__name__)
+
+
+class OceanState(object):
+
+    state_index = "gelk_state"
+    state_type = "repos"
+    # Repositories added by previous versions
+    legacy_repos = "conf/repos"
+    scroll_size = 100
+    scroll_time = "1m"
+    elastic = None
+    requests_ses = grimoire_con()
+
+    @classmethod
+    def get_index(cls):
+        return cls.state_index
+
+    @classmethod
+    def set_elastic(cls, elastic):
+        cls.elastic = elastic
+
+        # Check state index
+        url = elastic.url + "/" + cls.state_index
+        r = cls.requests_ses.get(url)
+        if r.status_code != 200:
+            # A few small documents: one shard is enough
+            settings = {"settings": {"number_of_shards": 1}}
+            cls.requests_ses.put(url, data=encode(settings))
+            logger.info("Creating Ocean state index " + url)
+
+    @classmethod
+    def get_repo_id(cls, index, origin):
+        ''' Id of the state of the origin fed into index '''
+
+        return cls.elastic.safe_index(index + "_" + origin)
+
+    @classmethod
+    def _get_url(cls):
+        return cls.elastic.url + "/" + cls.state_index + "/" + cls.state_type
+
+    @classmethod
+    def get_repo(cls, repo_id):
+        ''' State of a repository, None if it has never been fed '''
+
+        if cls.elastic is None:
+            logger.error("Can't get repo state. Ocean elastic is not configured")
+            return None
+
+        r = cls.requests_ses.get(cls._get_url() + "/" + repo_id)
+        if r.status_code == 404:
+            return None
+        r.raise_for_status()
+
+        return decode(r.content).get('_source')
+
+    @classmethod
+    def set_repo(cls, repo_id, repo):
+        ''' Replace the state of a repository '''
+
+        if cls.elastic is None:
+            logger.error("Can't set repo state. Ocean elastic is not configured")
+            return
+
+        url = cls._get_url() + "/" + repo_id
+
+        logger.debug("Setting repo state %s %s" % (url, repo))
+
+        r = cls.requests_ses.put(url, data=encode(repo))
+        if r.status_code not in (200, 201):
+            logger.error("Can't set repo state %s: %s", url, r.text)
+
+    @classmethod
+    def remove_repo(cls, repo_id):
+        ''' Remove the state of a repository, True if it existed '''
+
+        removed = False
+        # Once removed, the legacy repository must not be listed again
+        for url in (cls._get_url(), cls.elastic.url + "/" + cls.legacy_repos):
+            r = cls.requests_ses.delete(url + "/" + repo_id)
+            if r.status_code == 404:
+                continue
+            r.raise_for_status()
+            removed = True
+
+        return removed
+
+    @classmethod
+    def _scan(cls, index=None):
+        ''' Generate all the state documents using a scroll '''
+
+        if cls.elastic is None:
+            logger.error("Can't get repos. Ocean elastic is not configured")
+            return
+
+        url = cls.elastic.url + "/" + (index if index else cls.state_index)
+        url += "/_search?scroll=%s" % cls.scroll_time
+        body = query.search(query=query.bool_query(), size=cls.scroll_size)
+
+        r = cls.requests_ses.post(url, data=encode(body))
+        if r.status_code == 404:
+            # Nothing fed yet
+            return
+        r.raise_for_status()
+        rjson = decode(r.content)
+
+        scroll_url = cls.elastic.url + "/_search/scroll"
+        scroll_id = rjson['_scroll_id']
+        try:
+            while rjson['hits']['hits']:
+                for hit in rjson['hits']['hits']:
+                    yield hit
+
+                scroll = {"scroll": cls.scroll_time, "scroll_id": scroll_id}
+                r = cls.requests_ses.post(scroll_url, data=encode(scroll))
+                r.raise_for_status()
+                rjson = decode(r.content)
+                scroll_id = rjson['_scroll_id']
+        finally:
+            cls.requests_ses.delete(scroll_url, data=encode({"scroll_id": [scroll_id]}))
+
+    @classmethod
+    def _scan_repos(cls):
+        ''' Generate the state documents and the legacy ones not fed since '''
+
+        repos_ids = set()
+        for hit in cls._scan():
+            repos_ids.add(hit['_id'])
+            yield hit
+
+        for hit in cls._scan(cls.legacy_repos):
+            if hit['_id'] not in repos_ids:
+                yield hit
+
+    @classmethod
+    def get_repos_items(cls):
+        ''' Generate the id and the state of all repositories '''
+
+        for hit in cls._scan_repos():
+            yield hit['_id'], hit['_source']
+
+    @classmethod
+    def get_repos(cls):
+        ''' Generate the state of all repositories '''
+
+        for hit in cls._scan_repos():
+            yield hit['_source']
+
+    @classmethod
+    def get_repos_ids(cls):
+        ''' Generate the ids of all repositories '''
+
+        for hit in cls._scan_repos():
+            yield hit['_id']
@@ -0,0 +1,132 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Progress of the feed and enrich processes
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+# Authors:
+#   Alvaro del Castillo San Felix <acs@bitergia.com>
+#
+
+import json
+import logging
+import os
+
+from datetime import datetime, timedelta
+from time import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class Progress(object):
+    """ Report periodically the items processed, throughput and ETA
+
+    Reports are logged and, if status_file is configured, written as
+    JSON to it so they can be checked from other tools.
+    """
+
+    interval = 60  # seconds between reports
+    status_file = None  # JSON file with the last report
+
+    def __init__(self, name, total=None, bulk=None):
+        """
+            :name: process reported
+            :total: items to be processed, if known
+            :bulk: BulkWriter used to upload the items, for MB/s
+        """
+
+        self.name = name
+        self.total = total
+        self.bulk = bulk
+        self.done = 0
+        self.start = time()
+        self.last_report = self.start
+
+    def update(self, done=1):
+        """ Add done items, reporting the progress if the interval is over """
+
+        self.done += done
+
+        now = time()
+        if now - self.last_report >= self.interval:
+            self.last_report = now
+            self.report()
+
+    def finish(self):
+        """ Report the final status """
+
+        self.report(finished=True)
+
+    def status(self, finished=False):
+        """ Return the current progress as a dict """
+
+        elapsed = time() - self.start
+        rate = self.done / elapsed if elapsed > 0 else 0
+
+        bulk_mb = 0
+        if self.bulk:
+            bulk_mb = self.bulk.stats["bytes"] / (1024 * 1024)
+
+        percent = None
+        eta = None
+        if self.total:
+            percent = min(100.0, 100.0 * self.done / self.total)
+            if rate > 0 and not finished:
+                eta = max(0, (self.total - self.done) / rate)
+
+        return {
+            "name": self.name,
+            "done": self.done,
+            "total": self.total,
+            "percent": percent,
+            "items_per_sec": rate,
+            "bulk_mb_per_sec": bulk_mb / elapsed if elapsed > 0 else 0,
+            "elapsed_sec": elapsed,
+            "eta_sec": eta,
+            "finished": finished,
+            "updated": datetime.utcnow().isoformat()
+        }
+
+    def report(self, finished=False):
+        """ Log the progress and write it to the status file """
+
+        status = self.status(finished)
+
+        done = "%i" % status["done"]
+        if status["total"]:
+            done += "/%i (%.1f%%)" % (status["total"], status["percent"])
+        eta = ""
+        if status["eta_sec"] is not None:
+            eta = ", ETA %s" % timedelta(seconds=int(status["eta_sec"]))
+
+        logger.info("%s: %s items, %.1f items/s, %.2f bulk MB/s%s", self.name, done,
+                    status["items_per_sec"], status["bulk_mb_per_sec"], eta)
+
+        if self.status_file:
+            self.write_status(status)
+
+    def write_status(self, status):
+        # Replace the file so readers never find it half written
+        status_tmp = self.status_file + ".tmp"
+        try:
+            with open(status_tmp, "w") as f:
+                json.dump(status, f, indent=4)
+            os.replace(status_tmp, self.status_file)
+        except OSError as ex:
+            logger.warning("Can't write status file %s: %s", self.status_file, ex)
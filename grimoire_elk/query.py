@@ -0,0 +1,108 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# ElasticSearch queries used to read the indexes
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+# Authors:
+#   Alvaro del Castillo San Felix <acs@bitergia.com>
+#
+
+"""Build ElasticSearch queries as dicts
+
+The queries are plain dicts, so they can be changed and reused between
+requests (for example, to get the next page) and are encoded only when
+sent. Filters in GrimoireELK are usually dicts with the name of the field
+and its value, as returned by get_repository_filter.
+"""
+
+
+def term(field, value):
+    return {"term": {field: value}}
+
+
+def terms(field, values):
+    return {"terms": {field: list(values)}}
+
+
+def range_gte(field, value):
+    return {"range": {field: {"gte": value}}}
+
+
+def filters_to_terms(_filters):
+    """ Convert a list of name/value filters to term queries """
+
+    return [term(_filter['name'], _filter['value'])
+            for _filter in _filters if _filter]
+
+
+def bool_query(must=None, should=None):
+    """ Bool query with the must and should queries, all items if empty """
+
+    query = {}
+    if must:
+        query["must"] = list(must)
+    if should:
+        query["should"] = list(should)
+
+    if not query:
+        return {"match_all": {}}
+
+    return {"bool": query}
+
+
+def sort_asc(*fields):
+    return [{field: {"order": "asc"}} for field in fields]
+
+
+def max_agg(field):
+    return {"max": {"field": field}}
+
+
+def min_agg(field):
+    return {"min": {"field": field}}
+
+
+def terms_agg(field, size, aggs=None):
+    agg = {"terms": {"field": field, "size": size}}
+    if aggs:
+        agg["aggs"] = aggs
+    return agg
+
+
+def search(query=None, size=None, sort=None, source=None, slice_=None,
+           search_after=None, aggs=None):
+    """ Body of a search request. Only the given parts are included. """
+
+    body = {}
+    if query:
+        body["query"] = query
+    if size is not None:
+        body["size"] = size
+    if sort:
+        body["sort"] = sort
+    if source:
+        body["_source"] = source
+    if slice_:
+        body["slice"] = slice_
+    if search_after:
+        body["search_after"] = search_after
+    if aggs:
+        body["aggs"] = aggs
+
+    return body
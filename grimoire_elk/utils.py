@@ -31,8 +31,7 @@ from urllib.parse import urljoin
 
 import requests
 
-from dateutil import parser
-
+from .dates import parse_date
 from .ocean.elastic import ElasticOcean
 
 # Connectors for Ocean
@@ -131,6 +130,7 @@ from perceval.backends.opnfv.functest import Functest, FunctestCommand
 
 from .elk.elastic import ElasticSearch
 from .elk.elastic import ElasticConnectException
+from .elk.utils import grimoire_con
 
 
 logger = logging.getLogger(__name__)
@@ -233,7 +233,7 @@ def get_kibiter_version(url):
     url += config_url
 
     try:
-        r = requests.get(url)
+        r = grimoire_con().get(url)
         r.raise_for_status()
         if not r.json()['hits']['hits']:
             logger.warning("Can not find Kibiter version")
@@ -318,9 +318,44 @@ def get_params_parser():
     parser.add_argument('--only-studies', action='store_true', help="Execute only studies.")
     parser.add_argument('--bulk-size', default=1000, type=int,
                         help="Number of items per bulk request to Elasticsearch.")
+    parser.add_argument('--bulk-max-mb', default=20, type=int,
+                        help="Max size in MB of a bulk request to Elasticsearch.")
+    parser.add_argument('--bulk-workers', default=1, type=int,
+                        help="Number of bulk requests sent in parallel to Elasticsearch.")
+    parser.add_argument('--bulk-load-merge', action='store_true',
+                        help="Force merge the indexes after full (not incremental) loads.")
+    parser.add_argument('--bulk-spool',
+                        help="Directory to keep the bulk requests Elasticsearch can not index "
+                             "(requests are sent by one worker).")
+    parser.add_argument('--replay-spool', action='store_true',
+                        help="Send to Elasticsearch the bulk requests kept in --bulk-spool.")
+    parser.add_argument('--http-gzip', action='store_true',
+                        help="Compress the body of bulk requests with gzip.")
+    parser.add_argument('--http-pool-size', default=10, type=int,
+                        help="HTTP connections kept alive for each Elasticsearch.")
     parser.add_argument('--scroll-size', default=100, type=int,
                         help="Number of items to get from Elasticsearch when scrolling.")
-    parser.add_argument('backend', help=argparse.SUPPRESS)
+    parser.add_argument('--scroll-slices', default=1, type=int,
+                        help="Number of slices of a scroll read in parallel from Elasticsearch.")
+    parser.add_argument('--scroll-unsorted', action='store_true',
+                        help="Don't sort the items read in each scroll slice.")
+    parser.add_argument('--scroll-adaptive', action='store_true',
+                        help="Adapt --scroll-size to the size of the items and Elasticsearch load.")
+    parser.add_argument('--scroll-prefetch', default=1, type=int,
+                        help="Pages read from Elasticsearch in advance (0 to disable).")
+    parser.add_argument('--search-after', action='store_true',
+                        help="Read raw items with search_after pages instead of a scroll.")
+    parser.add_argument('--no-source-filter', action='store_true',
+                        help="Read whole raw items, not only the fields used to enrich them.")
+    parser.add_argument('--enrich-workers', default=1, type=int,
+                        help="Number of processes enriching the items in parallel.")
+    parser.add_argument('--enrich-checkpoints', action='store_true',
+                        help="Resume the enrichment after the last raw item enriched.")
+    parser.add_argument('--progress-interval', default=60, type=int,
+                        help="Seconds between progress reports.")
+    parser.add_argument('--status-file',
+                        help="JSON file with the last progress report.")
+    parser.add_argument('backend', nargs='?', help=argparse.SUPPRESS)
     parser.add_argument('backend_args', nargs=argparse.REMAINDER,
                         help=argparse.SUPPRESS)
 
@@ -345,8 +380,8 @@ def get_time_diff_days(start_txt, end_txt):
     if start_txt is None or end_txt is None:
         return None
 
-    start = parser.parse(start_txt)
-    end = parser.parse(end_txt)
+    start = parse_date(start_txt)
+    end = parse_date(end_txt)
 
     seconds_day = float(60*60*24)
     diff_days = \
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+# Authors:
+#     Alvaro del Castillo <acs@bitergia.com>
+#
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+if '..' not in sys.path:
+    sys.path.insert(0, '..')
+
+from grimoire_elk.elk.elastic import BulkWriter, spooled_packs
+
+
+class MockResponse:
+
+    def __init__(self, status_code, rjson=None):
+        self.status_code = status_code
+        self.content = json.dumps(rjson if rjson else {}).encode('utf-8')
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError("HTTP error %i" % self.status_code)
+
+
+class MockElastic:
+    """ ElasticSearch answering the bulk requests with the given statuses
+
+    Each response is a status for the whole request, or a list with the
+    status of each document sent (200 for the ones not in the list).
+    """
+
+    url = "http://localhost:9200"
+    index = "test"
+    index_url = url + "/" + index
+    max_items_bulk = 1000
+    max_bytes_bulk = 1024 * 1024
+    bulk_workers = 1
+    bulk_max_retries = 2
+    bulk_backoff_factor = 0
+    bulk_max_latency = 10
+    bulk_spool_dir = None
+    http_compression = False
+
+    def __init__(self, responses=None):
+        self.responses = list(responses) if responses else []
+        self.requests = []  # ids of the documents in each request
+        self.bulk_stats = {"sent": 0, "failed": 0, "retried": 0, "dropped": 0,
+                           "spooled": 0, "bytes": 0}
+
+    def _safe_put_bulk(self, url, bulk_json, headers=None):
+        lines = bulk_json.decode('utf-8').splitlines()
+        ids = [json.loads(action)["index"]["_id"] for action in lines[::2]]
+        self.requests.append(ids)
+
+        response = self.responses.pop(0) if self.responses else []
+        if isinstance(response, int):
+            return MockResponse(response)
+
+        items = []
+        for pos in range(len(ids)):
+            status = response[pos] if pos < len(response) else 200
+            result = {"status": status}
+            if status >= 300:
+                result["error"] = {"type": "error %i" % status}
+            items.append({"index": result})
+
+        return MockResponse(200, {"errors": any(status >= 300 for status in response),
+                                  "items": items})
+
+
+def add_docs(bulk, ndocs):
+    for doc_id in range(ndocs):
+        bulk.add(str(doc_id), {"id": doc_id})
+
+
+class TestBulkWriter(unittest.TestCase):
+    """Unit tests for the bulk uploads"""
+
+    def test_check_response(self):
+        """Test whether the documents not indexed are found in the response"""
+
+        bulk = BulkWriter(MockElastic())
+        chunks = [b"a", b"b", b"c", b"d", b"e"]
+
+        self.assertEqual(bulk._check_response({"errors": False}, chunks), ([], 0))
+
+        rjson = {
+            "errors": True,
+            "items": [
+                {"index": {"status": 201}},
+                {"index": {"status": 429, "error": {"type": "es_rejected_execution_exception"}}},
+                {"index": {"status": 400, "error": {"type": "mapper_parsing_exception"}}},
+                {"update": {"status": 503, "error": {"type": "unavailable_shards_exception"}}},
+                {"index": {"status": 404, "error": {"type": "document_missing_exception"}}}
+            ]
+        }
+        self.assertEqual(bulk._check_response(rjson, chunks), ([b"b", b"d"], 2))
+
+    def test_packs(self):
+        """Test whether packs are sent when full in documents or bytes"""
+
+        elastic = MockElastic()
+        bulk = BulkWriter(elastic, max_items=3)
+        add_docs(bulk, 7)
+        self.assertEqual(len(elastic.requests), 2)
+        bulk.flush()
+
+        self.assertEqual(elastic.requests, [["0", "1", "2"], ["3", "4", "5"], ["6"]])
+        self.assertEqual(bulk.total, 7)
+        self.assertEqual(elastic.bulk_stats["sent"], 7)
+
+        elastic = MockElastic()
+        bulk = BulkWriter(elastic, max_bytes=40)
+        add_docs(bulk, 3)
+        bulk.flush()
+
+        # Each action and its document are less than 40 bytes
+        self.assertEqual(elastic.requests, [["0", "1"], ["2"]])
+
+    def test_retry_rejected(self):
+        """Test whether only the documents rejected are sent again"""
+
+        elastic = MockElastic([[200, 429, 400, 503], [429], []])
+        bulk = BulkWriter(elastic)
+        add_docs(bulk, 4)
+        bulk.flush()
+
+        self.assertEqual(elastic.requests, [["0", "1", "2", "3"], ["1", "3"], ["1"]])
+        self.assertEqual(bulk.stats["sent"], 3)
+        self.assertEqual(bulk.stats["failed"], 1)
+        self.assertEqual(bulk.stats["retried"], 3)
+        self.assertEqual(bulk.stats["dropped"], 0)
+
+    def test_retry_pack(self):
+        """Test whether packs rejected with 429 or 503 are sent again"""
+
+        elastic = MockElastic([429, 503])
+        bulk = BulkWriter(elastic)
+        add_docs(bulk, 2)
+        bulk.flush()
+
+        self.assertEqual(len(elastic.requests), 3)
+        self.assertEqual(bulk.stats["sent"], 2)
+        self.assertEqual(bulk.stats["retried"], 4)
+
+    def test_dropped(self):
+        """Test whether documents are dropped after the max retries"""
+
+        elastic = MockElastic([429, 429, 429])
+        bulk = BulkWriter(elastic)
+        add_docs(bulk, 2)
+        bulk.flush()
+
+        # The first request and bulk_max_retries retries
+        self.assertEqual(len(elastic.requests), 3)
+        self.assertEqual(bulk.stats["sent"], 0)
+        self.assertEqual(bulk.stats["dropped"], 2)
+
+    def test_adapt_size(self):
+        """Test whether packs are reduced with rejections and grow back"""
+
+        elastic = MockElastic()
+        bulk = BulkWriter(elastic, max_items=100)
+
+        bulk._adapt_size(0.1, True)
+        self.assertEqual(bulk.max_items, 50)
+        self.assertEqual(elastic.bulk_size, 50)
+
+        # Slow responses
+        bulk._adapt_size(elastic.bulk_max_latency + 1, False)
+        self.assertEqual(bulk.max_items, 25)
+
+        for i in range(3):
+            bulk._adapt_size(0.1, True)
+        self.assertEqual(bulk.max_items, BulkWriter.MIN_ITEMS)
+
+        bulk._adapt_size(0.1, False)
+        self.assertEqual(bulk.max_items, BulkWriter.MIN_ITEMS + 10)
+        for i in range(20):
+            bulk._adapt_size(0.1, False)
+        self.assertEqual(bulk.max_items, 100)
+
+        # Next writers for the index start with the size adapted
+        bulk._adapt_size(0.1, True)
+        self.assertEqual(BulkWriter(elastic, max_items=100).max_items, 50)
+
+    def test_adapt_size_limit(self):
+        """Test whether small packs are not made bigger when reduced"""
+
+        elastic = MockElastic([[429]])
+        bulk = BulkWriter(elastic, max_items=3)
+
+        bulk._adapt_size(0.1, True)
+        self.assertEqual(bulk.max_items, 3)
+
+        add_docs(bulk, 4)
+        bulk.flush()
+        self.assertTrue(all(len(ids) <= 3 for ids in elastic.requests))
+
+    def test_workers(self):
+        """Test whether all the packs are sent with several workers"""
+
+        elastic = MockElastic()
+        bulk = BulkWriter(elastic, max_items=2, workers=3)
+        add_docs(bulk, 9)
+        bulk.flush()
+
+        self.assertEqual(sorted(sum(elastic.requests, []), key=int),
+                         [str(doc_id) for doc_id in range(9)])
+        self.assertEqual(bulk.total, 9)
+
+    def test_spool_pending(self):
+        """Test whether new packs are spooled after the ones not replayed yet"""
+
+        spool_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, spool_dir)
+
+        elastic = MockElastic()
+        elastic.bulk_spool_dir = spool_dir
+        bulk = BulkWriter(elastic, max_items=2, workers=3)
+
+        # A single worker keeps the order of the packs
+        self.assertEqual(bulk.workers, 1)
+        self.assertFalse(bulk.spooling)
+
+        pending = os.path.join(spool_dir, "0" + BulkWriter.SPOOL_EXT)
+        open(pending, "wb").close()
+
+        bulk = BulkWriter(elastic, max_items=2)
+        add_docs(bulk, 3)
+        bulk.flush()
+
+        self.assertEqual(elastic.requests, [])
+        self.assertEqual(bulk.stats["spooled"], 3)
+        packs = spooled_packs(spool_dir)
+        self.assertEqual(len(packs), 3)
+        self.assertEqual(packs[0], pending)
+
+    def test_refresh_mode(self):
+        """Test whether unknown refresh modes are rejected"""
+
+        with self.assertRaises(ValueError):
+            BulkWriter(MockElastic(), refresh="always")
+
+
+if __name__ == "__main__":
+    unittest.main(buffer=True)
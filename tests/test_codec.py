@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+# Authors:
+#     Alvaro del Castillo <acs@bitergia.com>
+#
+
+import json
+import sys
+import unittest
+
+from datetime import datetime
+
+if '..' not in sys.path:
+    sys.path.insert(0, '..')
+
+from grimoire_elk.codec import CODECS, encode, decode
+
+
+ITEM = {
+    "origin": "https://github.com/grimoirelab/perceval",
+    "title": "Añadir soporte para 日本語",
+    "id": 1234,
+    "ratio": 0.25,
+    "closed": False,
+    "labels": ["bug", "enhancement"],
+    "assignee": None,
+    "data": {"nested": [{"a": 1}, {"b": [True, None]}]}
+}
+
+
+class TestCodec(unittest.TestCase):
+    """Unit tests for the JSON codecs"""
+
+    def test_default(self):
+        """Test whether the default codec is one of the available"""
+
+        self.assertIn("json", CODECS)
+        self.assertIn((encode, decode), CODECS.values())
+
+    def test_round_trip(self):
+        """Test whether documents are decoded as they were encoded"""
+
+        for name, (codec_encode, codec_decode) in CODECS.items():
+            data = codec_encode(ITEM)
+            self.assertIsInstance(data, bytes, name)
+            self.assertEqual(codec_decode(data), ITEM, name)
+            self.assertEqual(json.loads(data.decode('utf-8')), ITEM, name)
+
+    def test_decode_str(self):
+        """Test whether str and bytes are decoded"""
+
+        for name, (codec_encode, codec_decode) in CODECS.items():
+            self.assertEqual(codec_decode('{"a": "ñ"}'), {"a": "ñ"}, name)
+            self.assertEqual(codec_decode('{"a": "ñ"}'.encode('utf-8')), {"a": "ñ"}, name)
+
+    def test_as_json(self):
+        """Test whether data the fast codecs can't handle is encoded as with json"""
+
+        data = [
+            {1: "int key", None: "none key"},
+            {"big": 2 ** 70},
+            {"surrogate": "\ud800"}
+        ]
+
+        for name, (codec_encode, codec_decode) in CODECS.items():
+            for obj in data:
+                self.assertEqual(json.loads(codec_encode(obj).decode('utf-8')),
+                                 json.loads(json.dumps(obj)), name)
+
+    def test_encode_errors(self):
+        """Test whether the errors are the same as with json"""
+
+        for name, (codec_encode, codec_decode) in CODECS.items():
+            with self.assertRaises(TypeError):
+                codec_encode({"date": datetime(2017, 3, 7)})
+            with self.assertRaises(TypeError):
+                codec_encode({"set": {1, 2}})
+            with self.assertRaises(ValueError):
+                codec_decode(b'{"a": ')
+
+
+if __name__ == "__main__":
+    unittest.main(buffer=True)
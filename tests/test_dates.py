@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+# Authors:
+#     Alvaro del Castillo <acs@bitergia.com>
+#
+
+import sys
+import unittest
+import warnings
+
+from dateutil import parser
+
+if '..' not in sys.path:
+    sys.path.insert(0, '..')
+
+from grimoire_elk.dates import parse_date
+
+
+ISO_DATES = [
+    "2017-03-07",
+    "2017-03-07T10:27",
+    "2017-03-07T10:27:12",
+    "2017-03-07 10:27:12",
+    "2017-03-07T10:27:12.123",
+    "2017-03-07T10:27:12.123456789",
+    "2017-03-07T10:27:12,5",
+    "2017-03-07T10:27:12Z",
+    "2017-03-07T10:27:12.000Z",
+    "2017-03-07T10:27:12+00:00",
+    "2017-03-07T10:27:12+01:00",
+    "2017-03-07T10:27:12-0530",
+    "2017-03-07T10:27:12+02",
+    "2017-03-07 10:27:12 +0100",
+    "  2017-03-07T10:27:12Z  "
+]
+
+RFC2822_DATES = [
+    "Tue, 7 Mar 2017 10:27:12 +0100",
+    "Tue, 07 Mar 2017 10:27:12 -0800",
+    "Tue 7 Mar 2017 10:27:12 +0000",
+    "7 Mar 2017 10:27:12 +0100",
+    "7 Mar 2017 10:27 +0100",
+    "Tue, 7 Mar 2017 10:27:12 GMT",
+    "Tue, 7 Mar 2017 10:27:12 UTC",
+    "Tue, 7 Mar 2017 10:27:12 Z",
+    "Tue, 7 Mar 2017 10:27:12 UT",
+    "Tue, 7 MAR 2017 10:27:12 +0100"
+]
+
+CTIME_DATES = [
+    "Tue Mar 7 10:27:12 2017 +0100",
+    "Tue Mar 07 10:27:12 2017 -0500",
+    "Tue Mar 7 10:27:12 2017 +0000",
+    "Tue Mar 07 10:27:12 +0000 2017",
+    "Tue Mar 07 10:27:12 +0530 2017"
+]
+
+# Formats not parsed with the regular expressions
+OTHER_DATES = [
+    "Tue Mar 7 10:27:12 2017",
+    "2017/03/07 10:27:12",
+    "March 7, 2017",
+    "20170307T102712"
+]
+
+
+class TestDates(unittest.TestCase):
+    """Unit tests for the dates parsing"""
+
+    def assert_as_dateutil(self, dates):
+        for date in dates:
+            with warnings.catch_warnings():
+                # dateutil warns about the timezones it doesn't know (UT)
+                warnings.simplefilter("ignore")
+                expected = parser.parse(date)
+                parsed = parse_date(date)
+
+            self.assertEqual(parsed, expected, date)
+            self.assertEqual(parsed.tzinfo, expected.tzinfo, date)
+            if expected.tzinfo:
+                self.assertEqual(parsed.utcoffset(), expected.utcoffset(), date)
+
+    def test_iso(self):
+        """Test whether ISO 8601 dates are parsed like with dateutil"""
+
+        self.assert_as_dateutil(ISO_DATES)
+
+    def test_rfc2822(self):
+        """Test whether RFC 2822 dates are parsed like with dateutil"""
+
+        self.assert_as_dateutil(RFC2822_DATES)
+
+    def test_ctime(self):
+        """Test whether git and twitter dates are parsed like with dateutil"""
+
+        self.assert_as_dateutil(CTIME_DATES)
+
+    def test_other(self):
+        """Test whether other dates are parsed with dateutil"""
+
+        self.assert_as_dateutil(OTHER_DATES)
+
+    def test_invalid(self):
+        """Test whether invalid dates raise the dateutil errors"""
+
+        with self.assertRaises(ValueError):
+            parse_date("2017-02-30T10:27:12Z")
+        with self.assertRaises(ValueError):
+            parse_date("not a date")
+
+    def test_cache(self):
+        """Test whether the same date is parsed once"""
+
+        parse_date.cache_clear()
+        date = parse_date("2017-03-07T10:27:12Z")
+
+        self.assertIs(parse_date("2017-03-07T10:27:12Z"), date)
+        self.assertEqual(parse_date.cache_info().hits, 1)
+
+
+if __name__ == "__main__":
+    unittest.main(buffer=True, warnings='ignore')
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+# Authors:
+#     Alvaro del Castillo <acs@bitergia.com>
+#
+
+import random
+import sys
+import unittest
+
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+if '..' not in sys.path:
+    sys.path.insert(0, '..')
+
+from grimoire_elk.elk import enrich
+from grimoire_elk.elk.enrich import Enrich
+
+
+Organization = namedtuple('Organization', ['name'])
+Enrollment = namedtuple('Enrollment', ['start', 'end', 'organization'])
+
+ONE_USEC = timedelta(microseconds=1)
+
+
+def enrollment(start, end, name):
+    return Enrollment(start, end, Organization(name))
+
+
+def linear_enrollment(enrollments, item_date, unaffiliated="Unknown"):
+    """ Organization found checking the enrollments one by one """
+
+    if item_date and item_date.tzinfo:
+        item_date = (item_date - item_date.utcoffset()).replace(tzinfo=None)
+
+    for enroll in enrollments:
+        if not item_date:
+            return enroll.organization.name
+        if enroll.start <= item_date <= enroll.end:
+            return enroll.organization.name
+
+    return unaffiliated
+
+
+class MockSortingHat:
+    """ Only the changes counter of SortingHat is used by get_enrollment """
+
+    updates = 0
+
+
+class MockEnrich(Enrich):
+    """ Enricher with the enrollments of the uuids in a dict """
+
+    def __init__(self, enrollments):
+        self.unaffiliated_group = "Unknown"
+        self.enrollments = enrollments
+
+    def get_enrollments(self, uuid):
+        return self.enrollments.get(uuid, [])
+
+
+class TestEnrollments(unittest.TestCase):
+    """Unit tests for the organizations of the identities"""
+
+    def setUp(self):
+        # SortingHat could be not installed
+        patcher = mock.patch.object(enrich, 'SortingHat', MockSortingHat, create=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def assert_as_linear(self, enrollments, dates):
+        enricher = MockEnrich({"uuid": enrollments})
+
+        for date in dates:
+            self.assertEqual(enricher.get_enrollment("uuid", date),
+                             linear_enrollment(enrollments, date), date)
+
+    def test_overlapped(self):
+        """Test whether the first enrollment is used when they overlap"""
+
+        enrollments = [
+            enrollment(datetime(2010, 1, 1), datetime(2014, 1, 1), "Bitergia"),
+            enrollment(datetime(2012, 1, 1), datetime(2016, 1, 1), "GSyC"),
+            enrollment(datetime(1900, 1, 1), datetime(2100, 1, 1), "Individual"),
+            enrollment(datetime(2013, 1, 1), datetime(2013, 6, 1), "Example")
+        ]
+        enricher = MockEnrich({"uuid": enrollments})
+
+        self.assertEqual(enricher.get_enrollment("uuid", datetime(2013, 3, 1)), "Bitergia")
+        self.assertEqual(enricher.get_enrollment("uuid", datetime(2015, 3, 1)), "GSyC")
+        self.assertEqual(enricher.get_enrollment("uuid", datetime(2005, 3, 1)), "Individual")
+
+        dates = [datetime(year, month, 1) for year in range(2008, 2018) for month in (1, 6)]
+        self.assert_as_linear(enrollments, dates)
+
+    def test_bounds(self):
+        """Test whether the start and end dates are in the enrollments"""
+
+        enrollments = [
+            enrollment(datetime(2010, 1, 1), datetime(2012, 1, 1), "Bitergia"),
+            enrollment(datetime(2012, 1, 1), datetime(2014, 1, 1), "GSyC"),
+            enrollment(datetime(2016, 1, 1), datetime.max, "Example")
+        ]
+        dates = []
+        for enroll in enrollments:
+            dates += [enroll.start - ONE_USEC, enroll.start, enroll.start + ONE_USEC,
+                      enroll.end - ONE_USEC, enroll.end]
+        dates.append(datetime(2014, 1, 1) + ONE_USEC)
+
+        self.assert_as_linear(enrollments, dates)
+
+        enricher = MockEnrich({"uuid": enrollments})
+        self.assertEqual(enricher.get_enrollment("uuid", datetime(2012, 1, 1)), "Bitergia")
+        self.assertEqual(enricher.get_enrollment("uuid", datetime(2014, 1, 1) + ONE_USEC),
+                         "Unknown")
+
+    def test_timezones(self):
+        """Test whether dates with timezone are compared in UTC"""
+
+        enrollments = [
+            enrollment(datetime(2010, 1, 1), datetime(2011, 12, 31, 23, 0), "Bitergia"),
+            enrollment(datetime(2012, 1, 1), datetime(2014, 1, 1), "GSyC")
+        ]
+        enricher = MockEnrich({"uuid": enrollments})
+
+        # 2011-12-31 22:30 UTC
+        date = datetime(2012, 1, 1, 0, 30, tzinfo=timezone(timedelta(hours=2)))
+        self.assertEqual(enricher.get_enrollment("uuid", date), "Bitergia")
+        # 2012-01-01 03:00 UTC
+        date = datetime(2011, 12, 31, 22, 0, tzinfo=timezone(timedelta(hours=-5)))
+        self.assertEqual(enricher.get_enrollment("uuid", date), "GSyC")
+
+        dates = [datetime(2011, 12, 31, 23, 30, tzinfo=timezone(timedelta(hours=offset)))
+                 for offset in range(-12, 13)]
+        self.assert_as_linear(enrollments, dates)
+
+    def test_no_enrollments(self):
+        """Test whether identities without enrollments are unaffiliated"""
+
+        enricher = MockEnrich({"uuid": []})
+        enricher.unaffiliated_group = "Unaffiliated"
+
+        self.assertEqual(enricher.get_enrollment("uuid", datetime(2012, 1, 1)), "Unaffiliated")
+        self.assertEqual(enricher.get_enrollment("unknown", datetime(2012, 1, 1)), "Unaffiliated")
+        self.assertEqual(enricher.get_enrollment("uuid", None), "Unaffiliated")
+
+    def test_no_date(self):
+        """Test whether the first enrollment is used for items without date"""
+
+        enrollments = [
+            enrollment(datetime(2012, 1, 1), datetime(2014, 1, 1), "GSyC"),
+            enrollment(datetime(2010, 1, 1), datetime(2012, 1, 1), "Bitergia")
+        ]
+
+        self.assert_as_linear(enrollments, [None])
+
+    def test_random(self):
+        """Test whether random enrollments give the same organizations"""
+
+        rand = random.Random(0)
+        start = datetime(2000, 1, 1)
+
+        for i in range(200):
+            enrollments = []
+            for j in range(rand.randint(0, 6)):
+                enroll_start = start + timedelta(days=rand.randint(0, 3000))
+                enroll_end = enroll_start + timedelta(days=rand.randint(-5, 2000))
+                enrollments.append(enrollment(enroll_start, enroll_end, rand.choice("ABCD")))
+
+            dates = [None]
+            for enroll in enrollments:
+                dates += [enroll.start - ONE_USEC, enroll.start, enroll.end, enroll.end + ONE_USEC]
+            dates += [start + timedelta(days=rand.randint(-10, 6000),
+                                        seconds=rand.randint(0, 86400)) for k in range(20)]
+
+            self.assert_as_linear(enrollments, dates)
+
+    def test_sortinghat_updates(self):
+        """Test whether the enrollments are read again once SortingHat changes"""
+
+        enricher = MockEnrich({"uuid": []})
+        date = datetime(2012, 1, 1)
+
+        self.assertEqual(enricher.get_enrollment("uuid", date), "Unknown")
+
+        enricher.enrollments["uuid"] = [enrollment(datetime(1900, 1, 1),
+                                                   datetime(2100, 1, 1), "Bitergia")]
+        self.assertEqual(enricher.get_enrollment("uuid", date), "Unknown")
+
+        MockSortingHat.updates += 1
+        self.assertEqual(enricher.get_enrollment("uuid", date), "Bitergia")
+
+
+if __name__ == "__main__":
+    unittest.main(buffer=True)
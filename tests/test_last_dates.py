@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+# Authors:
+#     Alvaro del Castillo <acs@bitergia.com>
+#
+
+import json
+import sys
+import unittest
+
+from datetime import datetime, timezone
+
+if '..' not in sys.path:
+    sys.path.insert(0, '..')
+
+from grimoire_elk.elk.elastic import ElasticSearch
+
+
+class MockResponse:
+
+    def __init__(self, rjson):
+        self.rjson = rjson
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.rjson
+
+
+class MockRequests:
+    """ Session answering the searches with a max aggregation per origin """
+
+    def __init__(self, dates):
+        self.dates = dates
+        self.searches = []
+
+    def post(self, url, data=None):
+        body = json.loads(data)
+        self.searches.append(body)
+
+        if "origins" not in body["aggs"]:
+            # Max aggregation of a single origin
+            return MockResponse({"aggregations": {"1": {"value": None}}})
+
+        buckets = [{"key": origin, "1": {"value_as_string": date}}
+                   for origin, date in self.dates.items()]
+        return MockResponse({"aggregations": {"origins": {"buckets": buckets}}})
+
+
+def mock_elastic(dates):
+    # Don't connect to ElasticSearch to create the index
+    elastic = ElasticSearch.__new__(ElasticSearch)
+    elastic.index_url = "http://localhost:9200/test"
+    elastic.requests = MockRequests(dates)
+
+    return elastic
+
+
+class TestLastDates(unittest.TestCase):
+    """Unit tests for the last dates of many origins"""
+
+    def setUp(self):
+        ElasticSearch.last_dates_cache.clear()
+
+    def test_dates_by_origin(self):
+        """Test whether the dates of all the origins are found with one query"""
+
+        elastic = mock_elastic({"a": "2017-03-07T10:27:12Z"})
+        dates = elastic.get_last_dates_by_origin("metadata__updated_on", ["a", "b"])
+
+        self.assertEqual(dates, {"a": datetime(2017, 3, 7, 10, 27, 12, tzinfo=timezone.utc),
+                                 "b": None})
+        self.assertEqual(len(elastic.requests.searches), 1)
+        self.assertEqual(elastic.get_last_dates_by_origin("metadata__updated_on", []), {})
+
+    def test_cache(self):
+        """Test whether the cached dates are used once for each origin"""
+
+        elastic = mock_elastic({"a": "2017-03-07T10:27:12Z"})
+        elastic.get_last_dates_by_origin("metadata__updated_on", ["a", "b"])
+
+        self.assertEqual(elastic.get_last_date("metadata__updated_on",
+                                               [{"name": "origin", "value": "a"}]),
+                         datetime(2017, 3, 7, 10, 27, 12, tzinfo=timezone.utc))
+        self.assertIsNone(elastic.get_last_date("metadata__updated_on",
+                                                [{"name": "origin", "value": "b"}]))
+        self.assertEqual(len(elastic.requests.searches), 1)
+
+        # Once used the date is found again
+        elastic.get_last_date("metadata__updated_on", [{"name": "origin", "value": "a"}])
+        self.assertEqual(len(elastic.requests.searches), 2)
+
+        # Other fields and filters are not cached
+        elastic.get_last_date("grimoire_creation_date", [{"name": "origin", "value": "b"}])
+        elastic.get_last_date("metadata__updated_on", [{"name": "tag", "value": "b"}])
+        self.assertEqual(len(elastic.requests.searches), 4)
+
+
+if __name__ == "__main__":
+    unittest.main(buffer=True)
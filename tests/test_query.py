@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+# Authors:
+#     Alvaro del Castillo <acs@bitergia.com>
+#
+
+import sys
+import unittest
+
+if '..' not in sys.path:
+    sys.path.insert(0, '..')
+
+from grimoire_elk import query
+
+
+class TestQuery(unittest.TestCase):
+    """Unit tests for the ElasticSearch queries"""
+
+    def test_leaf_queries(self):
+        """Test whether term, terms and range queries are built"""
+
+        self.assertEqual(query.term("origin", "https://a"),
+                         {"term": {"origin": "https://a"}})
+        self.assertEqual(query.terms("tag", ("a", "b")),
+                         {"terms": {"tag": ["a", "b"]}})
+        self.assertEqual(query.range_gte("metadata__timestamp", "2017-03-07"),
+                         {"range": {"metadata__timestamp": {"gte": "2017-03-07"}}})
+
+    def test_filters_to_terms(self):
+        """Test whether empty filters are skipped"""
+
+        filters = [{"name": "origin", "value": "https://a"}, None, {}]
+
+        self.assertEqual(query.filters_to_terms(filters),
+                         [{"term": {"origin": "https://a"}}])
+        self.assertEqual(query.filters_to_terms([]), [])
+
+    def test_bool_query(self):
+        """Test whether bool queries include only the given clauses"""
+
+        must = [query.term("origin", "https://a")]
+        should = [query.term("uuid", "1"), query.term("uuid", "2")]
+
+        self.assertEqual(query.bool_query(), {"match_all": {}})
+        self.assertEqual(query.bool_query(must=[], should=[]), {"match_all": {}})
+        self.assertEqual(query.bool_query(must=must), {"bool": {"must": must}})
+        self.assertEqual(query.bool_query(must=must, should=should),
+                         {"bool": {"must": must, "should": should}})
+
+    def test_aggs(self):
+        """Test whether sort and aggregations are built"""
+
+        self.assertEqual(query.sort_asc("metadata__timestamp", "_uid"),
+                         [{"metadata__timestamp": {"order": "asc"}},
+                          {"_uid": {"order": "asc"}}])
+        self.assertEqual(query.max_agg("offset"), {"max": {"field": "offset"}})
+        self.assertEqual(query.min_agg("offset"), {"min": {"field": "offset"}})
+        self.assertEqual(query.terms_agg("Author", 10, {"1": query.max_agg("date")}),
+                         {"terms": {"field": "Author", "size": 10},
+                          "aggs": {"1": {"max": {"field": "date"}}}})
+
+    def test_search(self):
+        """Test whether only the given parts are included in the search body"""
+
+        self.assertEqual(query.search(), {})
+        self.assertEqual(query.search(size=0), {"size": 0})
+
+        body = query.search(query=query.bool_query(), size=100,
+                            sort=query.sort_asc("offset"), source=["origin"],
+                            slice_={"id": 0, "max": 2}, search_after=[10, "a"],
+                            aggs={"1": query.max_agg("offset")})
+        self.assertEqual(body, {
+            "query": {"match_all": {}},
+            "size": 100,
+            "sort": [{"offset": {"order": "asc"}}],
+            "_source": ["origin"],
+            "slice": {"id": 0, "max": 2},
+            "search_after": [10, "a"],
+            "aggs": {"1": {"max": {"field": "offset"}}}
+        })
+
+
+if __name__ == "__main__":
+    unittest.main(buffer=True)
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+# Authors:
+#     Alvaro del Castillo <acs@bitergia.com>
+#
+
+import json
+import sys
+import unittest
+
+from unittest import mock
+
+if '..' not in sys.path:
+    sys.path.insert(0, '..')
+
+from grimoire_elk.elk.elastic import ElasticSearch
+from grimoire_elk.ocean.state import OceanState
+
+
+URL = "http://localhost:9200"
+
+
+class MockResponse:
+
+    def __init__(self, status_code, rjson=None):
+        self.status_code = status_code
+        self.content = json.dumps(rjson if rjson else {}).encode('utf-8')
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError("HTTP error %i" % self.status_code)
+
+
+class MockSession:
+    """ ElasticSearch with the documents of each index and type in a dict """
+
+    def __init__(self, indexes):
+        self.indexes = indexes
+
+    def post(self, url, data=None):
+        if url.endswith("/_search/scroll"):
+            # All the documents are in the first page
+            return MockResponse(200, {"_scroll_id": "1", "hits": {"hits": []}})
+
+        # Searches in an index or in a type of it
+        target = url[len(URL) + 1:].split("/_search")[0]
+        types = [index_type for index_type in self.indexes
+                 if index_type == target or index_type.startswith(target + "/")]
+        if not types:
+            return MockResponse(404)
+        hits = [{"_id": doc_id, "_source": doc}
+                for index_type in types
+                for doc_id, doc in self.indexes[index_type].items()]
+        return MockResponse(200, {"_scroll_id": "1", "hits": {"hits": hits}})
+
+    def delete(self, url, data=None):
+        if "/_search/scroll" in url:
+            return MockResponse(200)
+
+        index, doc_id = url[len(URL) + 1:].rsplit("/", 1)
+        if doc_id not in self.indexes.get(index, {}):
+            return MockResponse(404)
+        del self.indexes[index][doc_id]
+        return MockResponse(200)
+
+
+class TestOceanState(unittest.TestCase):
+    """Unit tests for the state of the repositories"""
+
+    def set_indexes(self, indexes):
+        session = MockSession(indexes)
+        patcher = mock.patch.object(OceanState, 'requests_ses', session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        elastic = ElasticSearch.__new__(ElasticSearch)
+        elastic.url = URL
+        patcher = mock.patch.object(OceanState, 'elastic', elastic)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        return session
+
+    def test_legacy_repos(self):
+        """Test whether the repositories of previous versions are listed"""
+
+        self.set_indexes({
+            "gelk_state/repos": {"git_a": {"origin": "a", "last_update": "2017-03-07"}},
+            "conf/repos": {"git_a": {"index": "git"}, "git_b": {"index": "git"}}
+        })
+
+        self.assertEqual(list(OceanState.get_repos_items()),
+                         [("git_a", {"origin": "a", "last_update": "2017-03-07"}),
+                          ("git_b", {"index": "git"})])
+        self.assertEqual(list(OceanState.get_repos_ids()), ["git_a", "git_b"])
+
+    def test_no_legacy_repos(self):
+        """Test whether repositories are listed without previous versions"""
+
+        self.set_indexes({"gelk_state/repos": {"git_a": {"origin": "a"}}})
+        self.assertEqual(list(OceanState.get_repos()), [{"origin": "a"}])
+
+        self.set_indexes({})
+        self.assertEqual(list(OceanState.get_repos()), [])
+
+    def test_remove_legacy_repo(self):
+        """Test whether removed repositories are not listed again"""
+
+        session = self.set_indexes({
+            "gelk_state/repos": {"git_a": {"origin": "a"}},
+            "conf/repos": {"git_a": {"index": "git"}, "git_b": {"index": "git"}}
+        })
+
+        self.assertTrue(OceanState.remove_repo("git_a"))
+        self.assertTrue(OceanState.remove_repo("git_b"))
+        self.assertFalse(OceanState.remove_repo("git_c"))
+        self.assertEqual(list(OceanState.get_repos()), [])
+        self.assertEqual(session.indexes["conf/repos"], {})
+
+
+if __name__ == "__main__":
+    unittest.main(buffer=True)
@@ -0,0 +1,214 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# GrimoireELK micro benchmarks using the tests data
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+# Authors:
+#   Alvaro del Castillo San Felix <acs@bitergia.com>
+#
+
+import argparse
+import glob
+import gzip
+import json
+import logging
+import os
+import re
+
+from os import sys
+from time import time
+
+from dateutil import parser
+
+from grimoire_elk.codec import CODECS
+from grimoire_elk.dates import parse_date
+from grimoire_elk.elk.elastic import BulkWriter, ElasticSearch
+from grimoire_elk.utils import config_logging
+
+BENCH_INDEX = "gelk_bench"
+# Fields with dates in the items, parsed by the enrichers
+DATE_FIELDS = re.compile(r"date|Date|created|updated|_at$|_on$|_ts$|time")
+DATA_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "tests", "data")
+
+
+def get_params():
+    """Parse command line arguments"""
+
+    parser = argparse.ArgumentParser(usage="usage: gelk_bench.py [options] benchmark",
+                                     description="Micro benchmarks with the tests data")
+
+    parser.add_argument("benchmark", choices=["bulk", "dates", "json"], help="benchmark to run")
+    parser.add_argument("-e", "--elastic_url",
+                        help="Elasticsearch used to measure the upload time")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="JSON data files")
+    parser.add_argument("--repeat", default=10, type=int,
+                        help="times each measure is repeated")
+    parser.add_argument('-g', '--debug', dest='debug', action='store_true')
+
+    return parser.parse_args()
+
+
+def load_data(data_dir):
+    """ Return the items in each JSON file of data_dir """
+
+    data = {}
+
+    for data_file in sorted(glob.glob(os.path.join(data_dir, "*.json"))):
+        name = os.path.basename(data_file).replace(".json", "")
+        with open(data_file) as f:
+            data[name] = json.load(f)
+
+    return data
+
+
+def bench_bulk(data, elastic_url, repeat):
+    """ Bytes on the wire and time for plain and gzip bulk requests """
+
+    print("%-15s %8s %10s %10s %7s %9s" % ("data", "items", "plain KB", "gzip KB",
+                                           "ratio", "gzip ms"))
+
+    for name, items in data.items():
+        body = "".join('{"index" : {"_id" : "%i" } }\n%s\n' % (i, json.dumps(item))
+                       for i, item in enumerate(items)).encode('utf-8')
+
+        task_init = time()
+        for i in range(repeat):
+            body_gzip = gzip.compress(body, BulkWriter.COMPRESS_LEVEL)
+        gzip_time = (time() - task_init) / repeat
+
+        print("%-15s %8i %10.1f %10.1f %7.1f %9.2f" %
+              (name, len(items), len(body) / 1024, len(body_gzip) / 1024,
+               len(body) / len(body_gzip), gzip_time * 1000))
+
+    if not elastic_url:
+        return
+
+    print()
+    print("%-15s %12s %12s" % ("data", "plain sec", "gzip sec"))
+
+    for name, items in data.items():
+        times = []
+        for compress in (False, True):
+            ElasticSearch.http_compression = compress
+            elastic = ElasticSearch(elastic_url, BENCH_INDEX, clean=True)
+
+            task_init = time()
+            for i in range(repeat):
+                bulk = BulkWriter(elastic)
+                for pos, item in enumerate(items):
+                    bulk.add(pos, item)
+                bulk.flush()
+            times.append((time() - task_init) / repeat)
+
+        print("%-15s %12.3f %12.3f" % (name, times[0], times[1]))
+
+    elastic.requests.delete(elastic.index_url)
+
+
+def get_dates(item, field=None):
+    """ Generate the strings in the date fields of an item """
+
+    if isinstance(item, dict):
+        for key, value in item.items():
+            yield from get_dates(value, key)
+    elif isinstance(item, list):
+        for value in item:
+            yield from get_dates(value, field)
+    elif isinstance(item, str) and field and DATE_FIELDS.search(field):
+        yield item
+
+
+def bench_dates(data, repeat):
+    """ Parsing time per item of the dates with dateutil and parse_date """
+
+    print("%-15s %8s %8s %12s %12s %12s" % ("data", "items", "dates", "dateutil us",
+                                            "fast us", "cached us"))
+
+    for name, items in data.items():
+        items_dates = []
+        for item in items:
+            dates = []
+            for date in get_dates(item):
+                try:
+                    parser.parse(date)
+                    dates.append(date)
+                except (ValueError, OverflowError):
+                    pass
+            items_dates.append(dates)
+
+        ndates = sum(len(dates) for dates in items_dates)
+        if not ndates:
+            continue
+
+        # parse_date.__wrapped__ is the regular expressions fast path, without the cache
+        parse_date.cache_clear()
+        times = []
+        for parse in (parser.parse, parse_date.__wrapped__, parse_date):
+            task_init = time()
+            for i in range(repeat):
+                for dates in items_dates:
+                    for date in dates:
+                        parse(date)
+            times.append((time() - task_init) / repeat / len(items))
+
+        print("%-15s %8i %8i %12.1f %12.1f %12.1f" %
+              (name, len(items), ndates, times[0] * 1e6, times[1] * 1e6, times[2] * 1e6))
+
+
+def bench_json(data, repeat):
+    """ Encoding and decoding time with each JSON codec available """
+
+    print("%-15s %8s %-8s %12s %12s" % ("data", "items", "codec", "encode ms", "decode ms"))
+
+    for name, items in data.items():
+        for codec_name, (encode, decode) in sorted(CODECS.items()):
+            task_init = time()
+            for i in range(repeat):
+                docs = [encode(item) for item in items]
+            encode_time = (time() - task_init) / repeat
+
+            task_init = time()
+            for i in range(repeat):
+                for doc in docs:
+                    decode(doc)
+            decode_time = (time() - task_init) / repeat
+
+            print("%-15s %8i %-8s %12.3f %12.3f" % (name, len(items), codec_name,
+                                                    encode_time * 1000, decode_time * 1000))
+
+
+if __name__ == '__main__':
+
+    args = get_params()
+
+    config_logging(args.debug)
+
+    try:
+        data = load_data(args.data_dir)
+
+        if args.benchmark == "bulk":
+            bench_bulk(data, args.elastic_url, args.repeat)
+        elif args.benchmark == "dates":
+            bench_dates(data, args.repeat)
+        elif args.benchmark == "json":
+            bench_json(data, args.repeat)
+
+    except KeyboardInterrupt:
+        logging.info("\n\nReceived Ctrl-C or other break signal. Exiting.\n")
+        sys.exit(0)
@@ -26,11 +26,10 @@
 import argparse
 from datetime import datetime
 import logging
-import requests
 
 
 from grimoire_elk.ocean.elastic import ElasticOcean
-from grimoire_elk.ocean.conf import ConfOcean
+from grimoire_elk.ocean.state import OceanState
 from grimoire_elk.utils import get_elastic, config_logging, get_connector_from_name
 
 from grimoire_elk.elk.sortinghat import SortingHat
@@ -51,12 +50,10 @@ def get_params():
 
 def get_perceval_params(url, index):
     logging.info("Get perceval params for index: %s" % (index))
-    elastic = get_elastic(url, ConfOcean.get_index())
-    ConfOcean.set_elastic(elastic)
+    elastic = get_elastic(url, OceanState.get_index())
+    OceanState.set_elastic(elastic)
 
-    r = requests.get(elastic.index_url+"/repos/"+index)
-
-    params = r.json()['_source']['params']
+    params = OceanState.get_repo(index)['backend_params']
 
     return params
 
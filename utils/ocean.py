@@ -26,17 +26,16 @@
 import argparse
 from datetime import datetime
 import logging
-import requests
 import sys
 
 from grimoire_elk.elk.elastic import ElasticSearch, ElasticConnectException, ElasticWriteException
 from grimoire_elk.ocean.elastic import ElasticOcean
-from grimoire_elk.ocean.conf import ConfOcean
+from grimoire_elk.ocean.state import OceanState
 
 def get_elastic():
 
     try:
-        ocean_index = ConfOcean.get_index()
+        ocean_index = OceanState.get_index()
         elastic_ocean = ElasticSearch(args.elastic_url, ocean_index)
 
     except ElasticConnectException:
@@ -72,35 +71,32 @@ def get_params():
 def list_repos_ids():
     logging.debug("Listing repos ids")
     elastic = get_elastic()
-    ConfOcean.set_elastic(elastic)
+    OceanState.set_elastic(elastic)
 
-    for repo_id in ConfOcean.get_repos_ids():
+    for repo_id in OceanState.get_repos_ids():
         print(repo_id)
 
 
 def list_repos():
     logging.debug("Listing repos")
     elastic = get_elastic()
-    ConfOcean.set_elastic(elastic)
+    OceanState.set_elastic(elastic)
 
-    for repo_id in ConfOcean.get_repos_ids():
-        elastic = get_elastic()
-        url = elastic.index_url + "/repos/" + repo_id
-        r = requests.get(url)
-        repo = r.json()['_source']
-        print ("%s %s %s" % (repo_id, repo['repo_update'], repo['success']))
+    # Repositories added by previous versions have no last update
+    for repo_id, repo in OceanState.get_repos_items():
+        print ("%s %s %s %s" % (repo_id, repo['repo_update'], repo['success'],
+                                repo.get('last_update')))
 
 
 def remove_repo(repo_id):
     logging.info("Removing repo: %s" % (repo_id))
     elastic = get_elastic()
-    url = elastic.index_url + "/repos/" + repo_id
-    r = requests.delete(url)
+    OceanState.set_elastic(elastic)
 
-    if r.status_code == 200:
+    if OceanState.remove_repo(repo_id):
         logging.info("Done")
     else:
-        logging.error("Can not remove %s (%i)" % (repo_id, r.status_code))
+        logging.error("Can not remove %s (not found)" % (repo_id))
 
 def config_logging(debug):
 
@@ -28,11 +28,14 @@ import logging
 from os import sys
 from time import time, sleep
 
-from grimoire_elk.arthur import feed_backend, enrich_backend
+from grimoire_elk.arthur import feed_backend, enrich_backend, load_last_dates
 from grimoire_elk.elastic_items import ElasticItems
+from grimoire_elk.elk.enrich import Enrich
 
-from grimoire_elk.ocean.conf import ConfOcean
-from grimoire_elk.elk.elastic import ElasticSearch
+from grimoire_elk.ocean.state import OceanState
+from grimoire_elk.elk.elastic import ElasticSearch, ElasticWriteException, replay_spool
+from grimoire_elk.elk.utils import config_http_pool, TAG_FILTER_BACKENDS
+from grimoire_elk.progress import Progress
 
 from grimoire_elk.utils import get_elastic
 from grimoire_elk.utils import get_params_parser, config_logging
@@ -47,20 +50,73 @@ def get_params():
     return args
 
 
+def get_repo_filter_value(repo):
+    ''' Value of the origin, or tag, of a repository in its indexes '''
+
+    params = repo['backend_params']
+    if repo['backend_name'] in TAG_FILTER_BACKENDS and '--tag' in params:
+        return params[params.index('--tag') + 1]
+
+    return repo.get('origin')
+
+
+def get_repos_last_dates(url, repos, enrich=False):
+    ''' Last dates of the repositories with one query per index
+
+        :returns: dict with the last date of each (index, origin), in
+                  the raw indexes or in the enriched ones
+    '''
+
+    groups = {}
+    for repo in repos:
+        value = get_repo_filter_value(repo)
+        if not value or not repo.get('index'):
+            continue
+        es_index = repo['index']
+        es_index_enrich = None
+        if enrich:
+            es_index_enrich = repo['index_enrich'] or es_index + "_enrich"
+            es_index = None
+        groups.setdefault((repo['backend_name'], es_index, es_index_enrich), set()).add(value)
+
+    last_dates = {}
+    for (backend_name, es_index, es_index_enrich), origins in groups.items():
+        try:
+            dates, enrich_dates = load_last_dates(url, backend_name, list(origins),
+                                                  es_index, es_index_enrich)
+        except Exception as ex:
+            # Each job will find the dates of its repository
+            logging.warning("Can't load the last dates of %s: %s", backend_name, ex)
+            continue
+        dates = enrich_dates if enrich else dates
+        if dates:
+            index = es_index_enrich if enrich else es_index
+            last_dates.update({(index, origin): date for origin, date in dates.items()})
+
+    return last_dates
+
+
 def feed_backends(url, clean, debug = False, redis = None):
     ''' Update Ocean for all existing backends '''
 
     logging.info("Updating all Ocean")
-    elastic = get_elastic(url, ConfOcean.get_index(), clean)
-    ConfOcean.set_elastic(elastic)
+    elastic = get_elastic(url, OceanState.get_index(), clean)
+    OceanState.set_elastic(elastic)
     fetch_cache = False
 
     q = Queue('update', connection=Redis(redis), async=async_)
 
-    for repo in ConfOcean.get_repos():
+    repos = list(OceanState.get_repos())
+    # Only needed by the repositories without the date of their last feed
+    last_dates = get_repos_last_dates(url, [repo for repo in repos
+                                            if not repo.get('last_update')])
+
+    for repo in repos:
+        last_date = last_dates.get((repo.get('index'), get_repo_filter_value(repo)))
         task_feed = q.enqueue(feed_backend, url, clean, fetch_cache,
                               repo['backend_name'], repo['backend_params'],
-                              repo['index'], repo['index_enrich'], repo['project'])
+                              repo['index'], repo['index_enrich'], repo['project'],
+                              last_date)
         logging.info("Queued job")
         logging.info(task_feed)
 
@@ -70,17 +126,24 @@ def enrich_backends(url, clean, debug = False, redis = None,
 
     logging.info("Enriching repositories")
 
-    elastic = get_elastic(url, ConfOcean.get_index(), clean)
-    ConfOcean.set_elastic(elastic)
+    elastic = get_elastic(url, OceanState.get_index(), clean)
+    OceanState.set_elastic(elastic)
     fetch_cache = False
 
     q = Queue('update', connection=Redis(redis), async=async_)
 
-    for repo in ConfOcean.get_repos():
+    repos = list(OceanState.get_repos())
+    last_dates = get_repos_last_dates(url, repos, enrich=True)
+
+    for repo in repos:
+        es_index_enrich = repo['index_enrich'] or repo['index'] + "_enrich"
+        last_enrich_date = last_dates.get((es_index_enrich, get_repo_filter_value(repo)))
         enrich_task = q.enqueue(enrich_backend,
                                 url, clean,
                                 repo['backend_name'], repo['backend_params'],
-                                repo['index'], repo['index_enrich'], db_projects_map, db_sortinghat)
+                                repo['index'], repo['index_enrich'], db_projects_map,
+                                db_sortinghat=db_sortinghat,
+                                last_enrich_date=last_enrich_date)
         logging.info("Queued job")
         logging.info(enrich_task)
 
@@ -120,12 +183,58 @@ if __name__ == '__main__':
         clean = True
 
     try:
-        if args.backend:
+        if args.replay_spool:
+            if not args.bulk_spool:
+                logging.error("--bulk-spool is needed to replay the spool")
+                sys.exit(1)
+            try:
+                replayed = replay_spool(args.bulk_spool)
+            except ElasticWriteException:
+                logging.error("Spool replay stopped. The packs not replayed are kept in %s",
+                              args.bulk_spool)
+                sys.exit(1)
+            logging.info("%i spooled items replayed", replayed)
+        elif args.backend:
             # Configure elastic bulk size and scrolling
             if args.bulk_size:
                 ElasticSearch.max_items_bulk = args.bulk_size
+            if args.bulk_max_mb:
+                ElasticSearch.max_bytes_bulk = args.bulk_max_mb * 1024 * 1024
+            if args.bulk_workers:
+                ElasticSearch.bulk_workers = args.bulk_workers
+            if args.bulk_load_merge:
+                ElasticSearch.bulk_load_force_merge = True
+            if args.http_gzip:
+                ElasticSearch.http_compression = True
+            if args.bulk_spool:
+                ElasticSearch.bulk_spool_dir = args.bulk_spool
             if args.scroll_size:
                 ElasticItems.scroll_size = args.scroll_size
+            if args.scroll_slices:
+                ElasticItems.scroll_slices = args.scroll_slices
+            if args.scroll_adaptive:
+                ElasticItems.scroll_adaptive = True
+            if args.scroll_prefetch is not None:
+                ElasticItems.scroll_prefetch = args.scroll_prefetch
+            if args.scroll_unsorted:
+                ElasticItems.scroll_slices_sorted = False
+            if args.search_after:
+                ElasticItems.fetch_search_after = True
+            if args.no_source_filter:
+                ElasticItems.source_filtering = False
+            if args.enrich_workers:
+                Enrich.enrich_workers = args.enrich_workers
+            if args.enrich_checkpoints:
+                Enrich.use_checkpoints = True
+            if args.progress_interval:
+                Progress.interval = args.progress_interval
+            if args.status_file:
+                Progress.status_file = args.status_file
+            if args.http_pool_size:
+                # Enough connections for all the bulk requests in flight
+                # and the scroll slices read in parallel
+                config_http_pool(max(args.http_pool_size,
+                                     2 * ElasticSearch.bulk_workers + ElasticItems.scroll_slices))
             if not args.enrich_only:
                 feed_backend(url, clean, args.fetch_cache,
                              args.backend, args.backend_args,